@@ -1,10 +1,18 @@
+from functools import partial
+
 import streamlit as st
 
-from ingestion.loaders import load_uploaded_file, load_youtube, load_web
-from ingestion.chunking import chunk_documents
-from ingestion.vectorstore import build_indices, add_documents
+from config import Config
+from ingestion.jobs import CANCELLED, FAILED, SUCCEEDED, IndexHandle, IngestionScheduler
+from ingestion.loaders import (
+    load_web,
+    supported_file_types,
+    uploaded_file_loader,
+)
+from ingestion.youtube import load_youtube_videos
 from retrieval.pipeline import run_rag_pipeline
 from utils.logger import get_logger
+from utils.tracing import render_prometheus
 
 logger = get_logger(__name__)
 
@@ -16,81 +24,150 @@ st.title("📚 Unified Interactive Cross-Modal RAG System")
 # Session State Initialization
 # ==========================================================
 
-if "vectorstore" not in st.session_state:
-    st.session_state.vectorstore = None
+# Live (vectorstore, bm25) pair; ingestion jobs swap in updates
+if "indices" not in st.session_state:
+    st.session_state.indices = IndexHandle()
 
-if "bm25" not in st.session_state:
-    st.session_state.bm25 = None
+if "scheduler" not in st.session_state:
+    st.session_state.scheduler = IngestionScheduler(st.session_state.indices)
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
 
 # ==========================================================
-# Sidebar - Data Ingestion
+# Sidebar - Data Ingestion (background jobs)
 # ==========================================================
 
 st.sidebar.header("Upload or Add Sources")
 
 uploaded_files = st.sidebar.file_uploader(
     "Upload Files (PDF, TXT, DOCX, CSV)",
-    type=["pdf", "txt", "docx", "csv"],
+    type=supported_file_types(),
     accept_multiple_files=True,
 )
 
-youtube_url = st.sidebar.text_input("YouTube URL")
+youtube_urls = st.sidebar.text_area(
+    "YouTube URLs or playlist (one per line)",
+    height=80,
+)
 web_url = st.sidebar.text_input("Website URL")
 
 if st.sidebar.button("Process Sources"):
 
-    all_docs = []
-
-    try:
-        # -------------------------
-        # File Uploads
-        # -------------------------
-        if uploaded_files:
-            for file in uploaded_files:
-                docs = load_uploaded_file(file)
-                all_docs.extend(docs)
-
-        # -------------------------
-        # YouTube
-        # -------------------------
-        if youtube_url:
-            yt_docs = load_youtube(youtube_url)
-            all_docs.extend(yt_docs)
-
-        # -------------------------
-        # Web
-        # -------------------------
-        if web_url:
-            web_docs = load_web(web_url)
-            all_docs.extend(web_docs)
-
-        if not all_docs:
-            st.sidebar.warning("No sources provided.")
+    loaders = []
+    labels = []
+
+    # -------------------------
+    # File Uploads
+    # -------------------------
+    for file in uploaded_files or []:
+        loaders.append(uploaded_file_loader(file.name, file.getvalue()))
+        labels.append(file.name)
+
+    # -------------------------
+    # YouTube
+    # -------------------------
+    videos = [line.strip() for line in youtube_urls.splitlines() if line.strip()]
+    if videos:
+        loaders.append(partial(load_youtube_videos, videos))
+        labels.append(videos[0] if len(videos) == 1 else f"{len(videos)} YouTube links")
+
+    # -------------------------
+    # Web
+    # -------------------------
+    if web_url:
+        loaders.append(partial(load_web, web_url))
+        labels.append(web_url)
+
+    if not loaders:
+        st.sidebar.warning("No sources provided.")
+    else:
+        st.session_state.scheduler.submit(", ".join(labels), loaders)
+        st.sidebar.info("Processing in the background. You can keep chatting.")
+
+
+@st.fragment(run_every=1.0)
+def render_jobs():
+    """
+    Live job list (re-rendered every second without rerunning
+    the whole script).
+    """
+    scheduler = st.session_state.scheduler
+    jobs = scheduler.jobs()
+
+    if not jobs:
+        return
+
+    st.markdown("**Ingestion Jobs**")
+
+    for job in reversed(jobs):
+        info = job.to_dict()
+        st.caption(f"{info['label']} — {info['status']} ({info['stage']})")
+
+        if info["status"] == SUCCEEDED:
+            st.success(f"Indexed {info['chunks_total']} chunks", icon="✅")
+            if info["chunks_dropped"]:
+                st.warning(
+                    f"{info['chunks_dropped']} more chunks were not indexed "
+                    f"(limit: {Config.MAX_TOTAL_CHUNKS} chunks per batch)"
+                )
+        elif info["status"] == FAILED:
+            st.error(f"Error processing sources: {info['error']}")
+        elif info["status"] == CANCELLED:
+            st.warning("Cancelled")
         else:
-            # Chunking
-            chunked_docs = chunk_documents(all_docs)
+            st.progress(
+                info["progress"],
+                text=f"{info['chunks_embedded']}/{info['chunks_total']} chunks "
+                f"· {info['chunks_per_second']} chunks/s",
+            )
+            if st.button("Cancel", key=f"cancel_{job.id}"):
+                scheduler.cancel(job.id)
 
-            if st.session_state.vectorstore is None:
-                vectorstore, bm25 = build_indices(chunked_docs)
-                st.session_state.vectorstore = vectorstore
-                st.session_state.bm25 = bm25
-            else:
-                vectorstore, bm25 = add_documents(
-                    st.session_state.vectorstore,
-                    st.session_state.bm25,
-                    chunked_docs,
-                )
-                st.session_state.vectorstore = vectorstore
-                st.session_state.bm25 = bm25
+    if any(job.done for job in jobs) and st.button("Clear finished"):
+        scheduler.clear_finished()
 
-            st.sidebar.success("Sources processed successfully!")
 
-    except Exception as e:
-        st.sidebar.error(f"Error processing sources: {e}")
+with st.sidebar:
+    render_jobs()
+
+
+# ==========================================================
+# Search Scope (metadata filters)
+# ==========================================================
+
+def render_scope():
+    """
+    Restricts retrieval to the selected source types / sources.
+    Nothing selected searches everything.
+    """
+    vectorstore, _ = st.session_state.indices.snapshot()
+    if vectorstore is None:
+        return None
+
+    filters = {}
+
+    with st.sidebar.expander("Search Scope"):
+        for field in Config.FILTER_FIELDS:
+            # Only chunks in this snapshot (the store is shared with
+            # jobs still indexing)
+            options = vectorstore.store.values(field, vectorstore.ids)
+            if not options:
+                continue
+
+            selected = st.multiselect(
+                f"Only {field.replace('_', ' ')}",
+                options,
+                key=f"scope_{field}",
+            )
+            if selected:
+                filters[field] = selected
+
+    return filters or None
+
+
+scope = render_scope()
 
 
 # ==========================================================
@@ -116,27 +193,61 @@ if user_input:
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
 
-            if st.session_state.vectorstore is None:
+            # Snapshot: a job finishing mid-answer does not affect it
+            vectorstore, bm25 = st.session_state.indices.snapshot()
+
+            # Sharded index whose worker processes died: drop it so
+            # the sources are re-processed into a fresh one
+            failed = getattr(vectorstore, "failed", None)
+            if failed:
+                with st.session_state.indices.commit_lock:
+                    st.session_state.indices.swap(None, None)
+                st.error(f"Search index lost ({failed}). Please process your sources again.")
+                vectorstore = None
+
+            if vectorstore is None:
                 answer = "No documents loaded."
                 sources = []
+                trace = None
             else:
                 result = run_rag_pipeline(
                     query=user_input,
-                    vectorstore=st.session_state.vectorstore,
-                    bm25=st.session_state.bm25,
+                    vectorstore=vectorstore,
+                    bm25=bm25,
                     chat_history=st.session_state.chat_history,
+                    filters=scope,
                 )
 
                 answer = result["answer"]
                 sources = result["sources"]
+                trace = result.get("trace")
 
             st.markdown(answer)
 
             if sources:
                 st.markdown("**Sources:**")
                 for src in sources:
+                    if src.get("start") is not None:
+                        minutes, seconds = divmod(int(src["start"]), 60)
+                        location = f"At: {minutes}:{seconds:02d}"
+                    else:
+                        location = f"Page: {src.get('page')}"
+
                     st.markdown(
-                        f"- {src.get('type')} | {src.get('source')} | Page: {src.get('page')}"
+                        f"- {src.get('type')} | {src.get('source')} | {location}"
+                    )
+
+            if trace:
+                with st.expander(f"Trace ({trace['total_ms']:.0f} ms)"):
+                    st.table(
+                        [
+                            {
+                                "stage": s["name"],
+                                "start (ms)": s["start_ms"],
+                                "duration (ms)": s["duration_ms"],
+                            }
+                            for s in trace["spans"]
+                        ]
                     )
 
     st.session_state.chat_history.append(
@@ -144,10 +255,19 @@ if user_input:
     )
 
 
+# ==========================================================
+# Metrics (Prometheus text format)
+# ==========================================================
+
+with st.sidebar.expander("Metrics"):
+    st.code(render_prometheus(), language="text")
+
+
 # ==========================================================
 # Reset Session
 # ==========================================================
 
 if st.sidebar.button("Reset Session"):
+    st.session_state.scheduler.shutdown(cancel=True)
     st.session_state.clear()
     st.rerun()
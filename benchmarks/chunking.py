@@ -0,0 +1,118 @@
+"""
+Chunking throughput: LangChain splitter vs span-based engine.
+
+Splits the same corpus with RecursiveCharacterTextSplitter
+(split_documents + metadata copy, the previous pipeline) and with
+ingestion.chunking (serial and process pool), checks that char-mode
+chunk texts are identical, and reports MB/s for each.
+
+Usage:
+    python benchmarks/chunking.py --files a.txt b.txt
+    python benchmarks/chunking.py --synthetic 200 --doc-chars 50000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from ingestion.chunking import (  # noqa: E402
+    chunk_limits,
+    get_splitter,
+    split_spans,
+    split_texts,
+)
+
+
+def synthetic_texts(n: int, chars: int, seed: int = 0):
+    """
+    Prose-like pages: sentences, line breaks and paragraphs.
+    """
+    rng = random.Random(seed)
+    vocab = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+        for _ in range(2000)
+    ]
+
+    texts = []
+    for _ in range(n):
+        parts, size = [], 0
+        while size < chars:
+            sentence = " ".join(rng.choice(vocab) for _ in range(rng.randint(5, 25))) + "."
+            sentence += rng.choice([" ", " ", " ", "\n", "\n\n"])
+            parts.append(sentence)
+            size += len(sentence)
+        texts.append("".join(parts))
+
+    return texts
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", nargs="*", help="Text files to split")
+    parser.add_argument("--synthetic", type=int, default=100, help="Number of documents")
+    parser.add_argument("--doc-chars", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.files:
+        texts = []
+        for path in args.files:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                texts.append(f.read())
+    else:
+        texts = synthetic_texts(args.synthetic, args.doc_chars)
+
+    megabytes = sum(len(t) for t in texts) / 1e6
+    size, overlap = chunk_limits("chars")
+
+    from langchain_core.documents import Document
+
+    documents = [Document(page_content=t, metadata={"source": f"doc{i}"}) for i, t in enumerate(texts)]
+    splitter = get_splitter()
+
+    def langchain():
+        chunks = splitter.split_documents(documents)
+        return [
+            Document(page_content=c.page_content.strip(), metadata=dict(c.metadata))
+            for c in chunks
+        ]
+
+    def serial():
+        return [split_spans(t, size, overlap) for t in texts]
+
+    def parallel():
+        Config.CHUNK_PARALLEL_MIN_CHARS = 0
+        Config.CHUNK_WORKERS = args.workers
+        return split_texts(texts)
+
+    reference, t_ref = timed(langchain)
+    spans, t_serial = timed(serial)
+    parallel_spans, t_parallel = timed(parallel)
+
+    ours = [t[s:e] for t, doc_spans in zip(texts, spans) for s, e in doc_spans]
+    identical = ours == [c.page_content for c in reference] and parallel_spans == spans
+
+    print(f"corpus: {len(texts)} docs, {megabytes:.1f} MB, {len(ours)} chunks")
+    print(f"identical chunks: {identical}")
+    print(f"{'engine':<22}{'seconds':>10}{'MB/s':>10}{'speedup':>10}")
+    for name, seconds in (
+        ("langchain", t_ref),
+        ("spans (serial)", t_serial),
+        ("spans (process pool)", t_parallel),
+    ):
+        print(f"{name:<22}{seconds:>10.3f}{megabytes / seconds:>10.2f}{t_ref / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Recall-vs-memory report for compact embedding storage.
+
+Compares reduced dimensions and float16 / int8 storage against
+exact full-dimension float32 search, before and after rescoring.
+
+Usage:
+    python benchmarks/embedding_recall.py --vectors corpus.npy --queries queries.npy
+    python benchmarks/embedding_recall.py --synthetic 20000 --dim 3072
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingestion.quantization import STORAGE_TYPES, recall_report  # noqa: E402
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, seed: int = 0):
+    """
+    Clustered unit vectors with a decaying spectrum, so leading
+    components carry more signal (as in Matryoshka embeddings).
+    """
+    rng = np.random.default_rng(seed)
+    scale = 1.0 / np.sqrt(np.arange(1, dim + 1, dtype=np.float32))
+
+    centers = rng.standard_normal((max(8, n // 200), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=n + n_queries)
+    points = centers[labels] + 0.6 * rng.standard_normal((n + n_queries, dim)).astype(np.float32)
+    points *= scale
+
+    return points[:n], points[n:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", help=".npy corpus embeddings")
+    parser.add_argument("--queries", help=".npy query embeddings")
+    parser.add_argument("--synthetic", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--dims", default="full,1536,768",
+                        help="Comma-separated dimensions; 'full' = native")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.load(args.vectors)
+        queries = np.load(args.queries) if args.queries else vectors[: args.n_queries]
+    else:
+        vectors, queries = synthetic_corpus(args.synthetic, args.dim, args.n_queries)
+
+    dims = [None if d == "full" else int(d) for d in args.dims.split(",")]
+
+    rows = recall_report(
+        vectors,
+        queries,
+        k=args.k,
+        dims=dims,
+        storages=STORAGE_TYPES,
+        rescore_factor=args.rescore_factor,
+    )
+
+    print(f"corpus={len(vectors)} queries={len(queries)} k={args.k}")
+    print(f"{'dim':>6} {'storage':>8} {'bytes/vec':>10} {'mem x':>7} "
+          f"{'recall coarse':>14} {'recall rescored':>16}")
+    for r in rows:
+        print(f"{r['dim']:>6} {r['storage']:>8} {r['bytes_per_vector']:>10} "
+              f"{r['memory_ratio']:>7} {r['recall_coarse']:>14} {r['recall_rescored']:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Import-time benchmark (python -X importtime).
+
+Imports each module in a fresh interpreter and reports its
+cumulative import time plus the heaviest transitive imports.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 5 --json import_times.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules imported by app.py at startup (app.py itself runs the
+# Streamlit script on import, so it is measured through these).
+DEFAULT_MODULES = [
+    "config",
+    "utils.tracing",
+    "ingestion.loaders",
+    "ingestion.chunking",
+    "ingestion.vectorstore",
+    "ingestion.jobs",
+    "ingestion.youtube",
+    "retrieval.pipeline",
+]
+
+
+def measure(module: str) -> Tuple[int, List[Tuple[int, str]]]:
+    """
+    Returns (cumulative microseconds for module, [(us, name), ...]).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr}")
+
+    total = 0
+    children: List[Tuple[int, str]] = []
+    pending: List[Tuple[int, str]] = []
+
+    # importtime prints children before their parent, indented by
+    # two spaces per level; collect the direct children of `module`.
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        cumulative_us, name = _parse(line)
+
+        if not cumulative_us.isdigit():
+            continue  # header line
+
+        if not name.startswith(" "):
+            if name == module:
+                total = int(cumulative_us)
+                children = pending
+            pending = []
+        elif not name.startswith("   "):
+            pending.append((int(cumulative_us), name.strip()))
+
+    return total, sorted(children, reverse=True)
+
+
+def _parse(line: str) -> Tuple[str, str]:
+    """
+    "import time:  self |  cumulative |   nested.name" ->
+    ("cumulative", "  nested.name"); leading spaces mark depth.
+    """
+    _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+    return cumulative_us.strip(), name.rstrip()[1:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict] = {}
+
+    for module in args.modules:
+        runs = []
+        heaviest: List[Tuple[int, str]] = []
+
+        for _ in range(args.repeat):
+            total, heaviest = measure(module)
+            runs.append(total)
+
+        median_ms = statistics.median(runs) / 1000
+        results[module] = {
+            "median_ms": round(median_ms, 2),
+            "runs_ms": [round(r / 1000, 2) for r in runs],
+            "heaviest": [
+                {"module": name, "ms": round(us / 1000, 2)}
+                for us, name in heaviest[: args.top]
+            ],
+        }
+
+        print(f"{module:<28} {median_ms:9.1f} ms")
+        for item in results[module]["heaviest"]:
+            print(f"    {item['module']:<40} {item['ms']:9.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
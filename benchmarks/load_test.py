@@ -0,0 +1,494 @@
+"""
+Multi-session load test for the end-to-end chat path.
+
+Simulates N concurrent chat sessions in one process (as Streamlit
+runs each session's script in its own thread), each replaying a
+query log through run_rag_pipeline with its own chat history and
+exponential think time between questions. Embedding and LLM calls
+go to local stand-ins with injected latency and error rates, so
+the run measures this process, not Gemini.
+
+Reports throughput, end-to-end and per-stage latency percentiles,
+error counts, memory growth per session, the query-embedding cache
+hit rate and GIL / thread contention (oversleep of a probe thread
+and the share of request wall time spent neither on CPU nor in
+injected backend latency).
+
+A replayed query log mostly hits the query-embedding cache, which
+hides embedding latency; --unique-queries or --query-cache-size 0
+measure the uncached path.
+
+Usage:
+    python benchmarks/load_test.py --sessions 1,4,16,32 --duration 20
+    python benchmarks/load_test.py --corpus docs/*.txt --queries queries.txt \\
+        --llm-latency 0.8 --llm-error-rate 0.02 --json load.json
+    python benchmarks/load_test.py --sessions 8 --unique-queries
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from utils.tracing import get_metrics  # noqa: E402
+
+_WORD = re.compile(r"\w+")
+
+# Suffix numbers for --unique-queries, distinct across sessions and levels
+_QUERY_SERIAL = itertools.count()
+
+
+# ==========================================================
+# Stand-in Backends
+# ==========================================================
+
+class FaultInjector:
+    """
+    Sleeps for a log-normal latency with the given mean (sleeping
+    releases the GIL, like a network call) and raises with
+    probability `error_rate`.
+    """
+
+    def __init__(self, name: str, latency: float, error_rate: float, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.injected_seconds = threading.local()
+
+    def __call__(self) -> None:
+        with self._lock:
+            delay = self._rng.lognormvariate(0, 0.5) * self.latency / 1.133 if self.latency else 0.0
+            fail = self._rng.random() < self.error_rate
+
+        if delay:
+            time.sleep(delay)
+        self.injected_seconds.value = getattr(self.injected_seconds, "value", 0.0) + delay
+
+        if fail:
+            raise RuntimeError(f"injected {self.name} error")
+
+
+class LocalEmbeddings:
+    """
+    Feature-hashed bag-of-words vectors: deterministic, cheap, and
+    similar for texts sharing words.
+    """
+
+    def __init__(self, dim: int, fault: FaultInjector):
+        self.dim = dim
+        self.fault = fault
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            h = zlib.crc32(word.encode())
+            vector[h % self.dim] += 1.0 if h & 1 << 31 else -1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        self.fault()
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        self.fault()
+        return self._vector(text)
+
+
+class LocalChatModel:
+    """
+    Answers with the first sentence of the prompt context and
+    reports token usage like ChatGoogleGenerativeAI.
+    """
+
+    def __init__(self, fault: FaultInjector, output_tokens: int = 120):
+        self.fault = fault
+        self.output_tokens = output_tokens
+
+    def invoke(self, messages):
+        from langchain_core.messages import AIMessage
+
+        self.fault()
+        prompt = "".join(str(m.content) for m in messages)
+        return AIMessage(
+            content=prompt[-400:].split(".")[0],
+            usage_metadata={
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": self.output_tokens,
+                "total_tokens": len(prompt) // 4 + self.output_tokens,
+            },
+        )
+
+
+def install_backends(embeddings: LocalEmbeddings, llm: LocalChatModel) -> None:
+    """
+    Replaces the Gemini singletons with the stand-ins.
+    """
+    import ingestion.embeddings
+    import retrieval.pipeline
+
+    ingestion.embeddings._embedding_instance = embeddings
+    retrieval.pipeline._llm_instance = llm
+
+
+# ==========================================================
+# Corpus + Query Log
+# ==========================================================
+
+def synthetic_text(rng: random.Random, vocab: Sequence[str], sentences: int) -> str:
+    return " ".join(
+        " ".join(rng.choice(vocab) for _ in range(rng.randint(6, 20))) + "."
+        for _ in range(sentences)
+    )
+
+
+def load_corpus(paths: Sequence[str], n_docs: int, seed: int):
+    from langchain_core.documents import Document
+
+    if paths:
+        documents = []
+        for path in paths:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                documents.append(
+                    Document(page_content=f.read(), metadata={"source": path, "source_type": "txt"})
+                )
+        return documents
+
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(3000)]
+    return [
+        Document(
+            page_content=synthetic_text(rng, vocab, 60),
+            metadata={"source": f"doc{i}.txt", "source_type": "txt"},
+        )
+        for i in range(n_docs)
+    ]
+
+
+def load_queries(path: Optional[str], chunks, n: int, seed: int) -> List[str]:
+    """
+    One query per line (plain text or JSONL with a "query" field);
+    synthetic queries sample words from random chunks.
+    """
+    if path:
+        queries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+        return queries
+
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        words = _WORD.findall(rng.choice(chunks).page_content)
+        queries.append("what about " + " ".join(rng.sample(words, min(4, len(words)))))
+    return queries
+
+
+# ==========================================================
+# Measurements
+# ==========================================================
+
+def rss_bytes() -> int:
+    """
+    Current resident set size (Linux /proc, else peak RSS).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ContentionProbe(threading.Thread):
+    """
+    Repeatedly sleeps `interval` and records how late it wakes up.
+    With many runnable threads, waking up also means waiting for
+    the GIL, so oversleep tracks interpreter contention.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True, name="gil-probe")
+        self.interval = interval
+        self.lateness: List[float] = []
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while not self._halt.is_set():
+            started = time.perf_counter()
+            time.sleep(self.interval)
+            self.lateness.append(time.perf_counter() - started - self.interval)
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+
+
+def query_cache_counts() -> Tuple[float, float]:
+    """
+    (hits, misses) of the query-embedding cache so far.
+    """
+    counters = get_metrics().snapshot()["counters"]
+    return tuple(
+        counters.get(f'rag_cache_requests_total{{cache="query_embedding",result="{result}"}}', 0.0)
+        for result in ("hit", "miss")
+    )
+
+
+def percentiles(values: Sequence[float], points=(50, 90, 95, 99)) -> Dict[str, float]:
+    if not values:
+        return {f"p{p}": 0.0 for p in points}
+    array = np.asarray(values) * 1000
+    return {f"p{p}": round(float(np.percentile(array, p)), 2) for p in points}
+
+
+# ==========================================================
+# Sessions
+# ==========================================================
+
+class Session(threading.Thread):
+    """
+    One simulated user: ask, wait think time, repeat.
+    """
+
+    def __init__(
+        self, number, queries, vectorstore, bm25, deadline, think_time, fault_sources, seed,
+        unique_queries=False,
+    ):
+        super().__init__(daemon=True, name=f"session-{number}")
+        self.queries = queries
+        self.unique_queries = unique_queries
+        self.vectorstore = vectorstore
+        self.bm25 = bm25
+        self.deadline = deadline
+        self.think_time = think_time
+        self.fault_sources = fault_sources
+        self.rng = random.Random(seed)
+        self.offset = number
+
+        self.chat_history: List[Dict[str, str]] = []
+        self.latencies: List[float] = []
+        self.wait_ratios: List[float] = []
+        self.stage_ms: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def run(self) -> None:
+        from retrieval.pipeline import run_rag_pipeline
+
+        i = self.offset
+        while time.perf_counter() < self.deadline:
+            query = self.queries[i % len(self.queries)]
+            if self.unique_queries:
+                query = f"{query} (#{next(_QUERY_SERIAL)})"
+            i += 1
+
+            for fault in self.fault_sources:
+                fault.injected_seconds.value = 0.0
+
+            started, cpu_started = time.perf_counter(), time.thread_time()
+            try:
+                result = run_rag_pipeline(query, self.vectorstore, self.bm25, self.chat_history)
+            except Exception as e:
+                name = type(e).__name__ if "injected" not in str(e) else str(e)
+                self.errors[name] = self.errors.get(name, 0) + 1
+                result = None
+
+            wall = time.perf_counter() - started
+            cpu = time.thread_time() - cpu_started
+            injected = sum(getattr(f.injected_seconds, "value", 0.0) for f in self.fault_sources)
+
+            if result is not None:
+                self.latencies.append(wall)
+                self.wait_ratios.append(max(wall - cpu - injected, 0.0) / wall if wall else 0.0)
+
+                for stage in result["trace"]["spans"]:
+                    self.stage_ms.setdefault(stage["name"], []).append(stage["duration_ms"])
+
+                # Same bookkeeping as app.py
+                self.chat_history.append({"role": "user", "content": query})
+                self.chat_history.append({"role": "assistant", "content": result["answer"]})
+
+            if self.think_time:
+                time.sleep(self.rng.expovariate(1.0 / self.think_time))
+
+
+def run_level(n_sessions: int, args, queries, vectorstore, bm25, faults) -> Dict:
+    """
+    Runs n_sessions concurrent sessions for args.duration seconds.
+    """
+    rss_before = rss_bytes()
+    hits_before, misses_before = query_cache_counts()
+    probe = ContentionProbe()
+    probe.start()
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    sessions = [
+        Session(
+            i, queries, vectorstore, bm25, deadline, args.think_time, faults, args.seed + i,
+            args.unique_queries,
+        )
+        for i in range(n_sessions)
+    ]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
+
+    elapsed = time.perf_counter() - started
+    probe.stop()
+    rss_after = rss_bytes()
+    hits, misses = query_cache_counts()
+    hits, misses = hits - hits_before, misses - misses_before
+
+    latencies = [v for s in sessions for v in s.latencies]
+    stage_ms: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    for session in sessions:
+        for name, values in session.stage_ms.items():
+            stage_ms.setdefault(name, []).extend(values)
+        for name, count in session.errors.items():
+            errors[name] = errors.get(name, 0) + count
+
+    wait_ratios = [v for s in sessions for v in s.wait_ratios]
+
+    return {
+        "sessions": n_sessions,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "stage_ms": {
+            name: {k: round(v / 1000, 2) for k, v in percentiles(values).items()}
+            for name, values in sorted(stage_ms.items())
+        },
+        "rss_growth_mb": round((rss_after - rss_before) / 1e6, 2),
+        "rss_growth_per_session_kb": round((rss_after - rss_before) / 1e3 / n_sessions, 1),
+        "query_cache_hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        "gil_probe_lateness_ms": percentiles(probe.lateness),
+        "wait_share": round(statistics.fmean(wait_ratios), 3) if wait_ratios else 0.0,
+    }
+
+
+# ==========================================================
+# Report
+# ==========================================================
+
+def print_report(rows: List[Dict]) -> None:
+    print(
+        f"{'sessions':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'errors':>8}{'RSS/sess KB':>13}{'GIL p99 ms':>12}{'wait':>7}{'q-cache':>9}"
+    )
+    for row in rows:
+        latency = row["latency_ms"]
+        print(
+            f"{row['sessions']:>8}{row['throughput_rps']:>9}{latency['p50']:>9}"
+            f"{latency['p95']:>9}{latency['p99']:>9}{sum(row['errors'].values()):>8}"
+            f"{row['rss_growth_per_session_kb']:>13}"
+            f"{row['gil_probe_lateness_ms']['p99']:>12}{row['wait_share']:>7}"
+            f"{row['query_cache_hit_rate']:>9.0%}"
+        )
+
+    last = rows[-1]
+    print(f"\nStage p50 / p99 (ms) at {last['sessions']} sessions:")
+    for name, values in last["stage_ms"].items():
+        print(f"  {name:<14}{values['p50']:>9}{values['p99']:>9}")
+
+    if last["errors"]:
+        print(f"\nErrors at {last['sessions']} sessions: {last['errors']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", default="1,4,16", help="Comma-separated session counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds between questions")
+    parser.add_argument("--corpus", nargs="*", help="Text files (default: synthetic)")
+    parser.add_argument("--docs", type=int, default=200, help="Synthetic documents")
+    parser.add_argument("--max-chunks", type=int, default=5000)
+    parser.add_argument("--queries", help="Query log: text lines or JSONL with 'query'")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument(
+        "--query-cache-size", type=int, default=Config.QUERY_CACHE_SIZE,
+        help="Query-embedding cache entries (0 disables the cache)",
+    )
+    parser.add_argument(
+        "--unique-queries", action="store_true",
+        help="Make every query distinct, so none hits the query-embedding cache",
+    )
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--embed-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    from ingestion.chunking import chunk_documents
+    from ingestion.vectorstore import build_indices
+
+    embed_fault = FaultInjector("embedding", args.embed_latency, args.embed_error_rate, args.seed)
+    llm_fault = FaultInjector("llm", args.llm_latency, args.llm_error_rate, args.seed + 1)
+    install_backends(LocalEmbeddings(args.dim, embed_fault), LocalChatModel(llm_fault))
+
+    # Index without injected latency / errors
+    Config.MAX_TOTAL_CHUNKS = args.max_chunks
+    Config.QUERY_CACHE_SIZE = args.query_cache_size
+    latency, error_rate = embed_fault.latency, embed_fault.error_rate
+    embed_fault.latency = embed_fault.error_rate = 0.0
+
+    chunks = chunk_documents(load_corpus(args.corpus, args.docs, args.seed))
+    vectorstore, bm25 = build_indices(chunks)
+    queries = load_queries(args.queries, chunks, 500, args.seed)
+
+    # Warm up (lazy imports, LLM / prompt code paths) so the first
+    # level's memory growth is not import cost
+    from retrieval.pipeline import run_rag_pipeline
+
+    llm_settings = llm_fault.latency, llm_fault.error_rate
+    llm_fault.latency = llm_fault.error_rate = 0.0
+    for query in queries[:5]:
+        run_rag_pipeline(query, vectorstore, bm25, [])
+    llm_fault.latency, llm_fault.error_rate = llm_settings
+
+    embed_fault.latency, embed_fault.error_rate = latency, error_rate
+
+    print(
+        f"{len(chunks)} chunks, {len(queries)} queries, "
+        f"think {args.think_time}s, embed {args.embed_latency}s, llm {args.llm_latency}s, "
+        f"query cache {args.query_cache_size}{' (unique queries)' if args.unique_queries else ''}, "
+        f"switch interval {sys.getswitchinterval() * 1000:.0f} ms\n"
+    )
+
+    rows = [
+        run_level(int(n), args, queries, vectorstore, bm25, [embed_fault, llm_fault])
+        for n in args.sessions.split(",")
+    ]
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Sharded vs in-process retrieval parity and latency.
+
+Indexes the same synthetic corpus (with duplicated chunks, so equal
+scores occur) in a DenseIndex + KeywordIndex and in a ShardedIndex,
+checks that dense and BM25 hits are identical on every shortlist
+path (unscoped, gathered scope, FAISS bitmap scope), and reports
+per-batch latency for both.
+
+Usage:
+    python benchmarks/sharded_parity.py --shards 3
+    python benchmarks/sharded_parity.py --chunks 50000 --dim 768 --shards 4
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from ingestion.chunkstore import ChunkStore  # noqa: E402
+from retrieval.dense import DenseIndex  # noqa: E402
+from retrieval.keyword import KeywordIndex  # noqa: E402
+from retrieval.sharded import ShardedIndex  # noqa: E402
+
+
+def synthetic_corpus(n: int, dim: int, duplicates: int, seed: int = 0):
+    """
+    Random texts + unit vectors; `duplicates` copies of chunk 0
+    spread over the id range.
+    """
+    from langchain_core.documents import Document
+
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(2000)]
+    texts = [" ".join(random.Random(i).choices(words, k=30)) for i in range(n)]
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+
+    for i in rng.choice(np.arange(1, n), size=duplicates, replace=False):
+        texts[i], vectors[i] = texts[0], vectors[0]
+
+    documents = [
+        Document(page_content=t, metadata={"source_type": ["pdf", "web", "youtube"][i % 3]})
+        for i, t in enumerate(texts)
+    ]
+    return documents, vectors
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--duplicates", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--shards", type=int, default=3)
+    args = parser.parse_args()
+
+    documents, vectors = synthetic_corpus(args.chunks, args.dim, args.duplicates)
+
+    store = ChunkStore()
+    ids = store.append(documents)
+
+    dense = DenseIndex(None, args.dim, storage="float32", store=store)
+    dense.add(ids, vectors)
+    keyword = KeywordIndex(store=store)
+    keyword.add(ids)
+
+    sharded = ShardedIndex(None, args.dim, shards=args.shards, storage="float32", store=store)
+    sharded.add(ids, vectors)
+
+    # Half the queries hit the duplicated chunk
+    query_vectors = np.concatenate([
+        np.repeat(vectors[:1], args.queries // 2, axis=0),
+        vectors[1 : args.queries - args.queries // 2 + 1],
+    ])
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    queries = [" ".join(d.page_content.split()[:3]) for d in documents[: args.queries]]
+
+    paths = [
+        ("unscoped", None, Config.FILTER_GATHER_MAX),
+        ("scope (gather)", {"source_type": "pdf"}, args.chunks),
+        ("scope (bitmap)", {"source_type": "pdf"}, 0),
+    ]
+
+    print(f"corpus: {args.chunks} chunks, dim {args.dim}, {args.duplicates} duplicates, "
+          f"{args.shards} shards")
+    print(f"{'path':<16}{'identical':>10}{'local ms':>10}{'sharded ms':>12}")
+
+    identical = True
+    gather_max_before = Config.FILTER_GATHER_MAX
+    try:
+        for name, filters, gather_max in paths:
+            # Both sides take the same shortlist path
+            Config.FILTER_GATHER_MAX = gather_max
+            sharded.pool.sync_settings()
+            allowed = store.select(filters)
+
+            def search(dense_index, keyword_index):
+                return (
+                    dense_index.search(query_vectors, allowed=allowed),
+                    keyword_index.search(queries, allowed=allowed),
+                )
+
+            local, t_local = timed(lambda: search(dense, keyword))
+            remote, t_sharded = timed(lambda: search(sharded, sharded.keyword))
+
+            same = local == remote
+            identical &= same
+            print(f"{name:<16}{str(same):>10}{t_local * 1000:>10.1f}{t_sharded * 1000:>12.1f}")
+    finally:
+        Config.FILTER_GATHER_MAX = gather_max_before
+        sharded.pool.close()
+
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
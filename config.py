@@ -8,9 +8,9 @@ class Config:
     # ---------------------------
     # API
     # ---------------------------
+    # Validated lazily (require_api_key) when a Gemini client is
+    # first built, so importing config never fails or blocks.
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    if not GOOGLE_API_KEY:
-        raise ValueError("GOOGLE_API_KEY not found in environment variables.")
 
     # ---------------------------
     # Models
@@ -18,6 +18,17 @@ class Config:
     LLM_MODEL = "models/gemini-2.5-flash"
     EMBEDDING_MODEL = "gemini-embedding-001"
 
+    # Embedding storage:
+    # - EMBEDDING_DIM: requested output dimensionality
+    #   (None = model default, 3072 for gemini-embedding-001)
+    # - EMBEDDING_STORAGE: "float32" | "float16" | "int8"
+    #   Compact modes search quantized codes, then rescore the
+    #   top (k * RESCORE_FACTOR) exactly from an on-disk copy.
+    EMBEDDING_DIM = None
+    EMBEDDING_STORAGE = "float32"
+    RESCORE_FACTOR = 4
+    VECTOR_CACHE_DIR = None  # None = system temp dir
+
     LLM_TEMPERATURE = 0.2
     LLM_MAX_TOKENS = 2048  # Lower for latency
 
@@ -26,15 +37,44 @@ class Config:
     # ---------------------------
     CHUNK_SIZE = 1200
     CHUNK_OVERLAP = 150
+    MAX_TOTAL_CHUNKS = 100
+
+    # Chunk sizing unit: "chars" (CHUNK_SIZE / CHUNK_OVERLAP) or
+    # "tokens" (estimated tokens, capped at the embedding input limit)
+    CHUNK_SIZE_UNIT = "chars"
+    CHUNK_SIZE_TOKENS = 300
+    CHUNK_OVERLAP_TOKENS = 40
+    EMBEDDING_MAX_TOKENS = 2048
+
+    # Split in a process pool above this many characters per batch
+    CHUNK_PARALLEL_MIN_CHARS = 2_000_000
+    CHUNK_WORKERS = None  # None = CPU count
 
 
     # ---------------------------
     # Retrieval
     # ---------------------------
     RETRIEVAL_K = 5         # Final top documents sent to LLM
-    FETCH_K = 15             # For MMR diversity
+    FETCH_K = 15             # Candidates per retrieval leg before fusion
+
+    # Dense MMR: re-rank a MMR_FETCH_K shortlist down to FETCH_K
+    MMR_FETCH_K = 50
+    MMR_LAMBDA = 0.5         # 1 = pure relevance, 0 = max diversity
+    DENSE_QUERY_BATCH = 64   # Queries per vectorized MMR block
+    QUERY_CACHE_SIZE = 256   # Cached query embeddings
+    KEYWORD_QUERY_BATCH = 256  # Queries per vectorized BM25 block
     SIMILARITY_THRESHOLD = 0.45  # More realistic threshold
 
+    # Metadata-filtered search: scopes up to this many chunks are
+    # scored exactly on gathered vectors, larger ones through a
+    # FAISS bitmap ID selector
+    FILTER_GATHER_MAX = 2048
+    FILTER_FIELDS = ["source_type", "source"]  # offered in the UI
+
+    # Scatter-gather: partition vectors + BM25 postings across this
+    # many worker processes (1 = in-process indices)
+    INDEX_SHARDS = 1
+
     # Hybrid Weights
     DENSE_WEIGHT = 0.75
     BM25_WEIGHT = 0.25
@@ -44,9 +84,40 @@ class Config:
     # ---------------------------
     MAX_CHAT_HISTORY = 5  # Keep last N messages only
 
+    # ---------------------------
+    # Batch Queries
+    # ---------------------------
+    BATCH_MAX_CONCURRENCY = 8  # Parallel LLM calls in run_rag_pipeline_batch
+
+    # ---------------------------
+    # Background Ingestion
+    # ---------------------------
+    INGEST_WORKERS = 2          # Concurrent ingestion jobs
+    INGEST_EMBED_BATCH = 32     # Chunks per embedding call (progress step)
+    INGEST_MAX_RETRIES = 2      # Per load / embed step
+    INGEST_RETRY_BACKOFF = 1.0  # Seconds, doubled per retry
+
+    # ---------------------------
+    # YouTube Transcripts
+    # ---------------------------
+    YOUTUBE_LANGUAGES = ["en"]          # Preference order
+    YOUTUBE_MAX_WORKERS = 4             # Concurrent transcript fetches
+    YOUTUBE_REQUESTS_PER_SECOND = 2.0   # Shared across workers
+    YOUTUBE_MAX_PLAYLIST_VIDEOS = 50
+    TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", ".cache/transcripts")
+
     # ---------------------------
     # Web Crawling (Optional)
     # ---------------------------
     MAX_CRAWL_DEPTH = 0      # was maybe 1 or 2
     MAX_CRAWL_PAGES = 5      # keep small
     REQUEST_TIMEOUT = 15
+
+    # ---------------------------
+    # Validation
+    # ---------------------------
+    @classmethod
+    def require_api_key(cls) -> str:
+        if not cls.GOOGLE_API_KEY:
+            raise ValueError("GOOGLE_API_KEY not found in environment variables.")
+        return cls.GOOGLE_API_KEY
@@ -1,14 +1,31 @@
-import uuid
-from typing import List
+from __future__ import annotations
 
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import bisect
+import re
+import uuid
+from collections import deque
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence, Tuple
 
 from config import Config
 from utils.logger import get_logger
+from utils.tracing import span
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 logger = get_logger(__name__)
 
+SEPARATORS = ["\n\n", "\n", ".", " ", ""]
+
+# (start, end) character offsets into the source text
+Span = Tuple[int, int]
+
+# Rough sub-word token estimate: words count as ceil(len / 4)
+# tokens, punctuation as one. No tokenizer download needed and
+# close to Gemini's ~4 chars / token for English prose.
+_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
 
 # ==========================================================
 # Recursive Chunking (Optimized for Hybrid Retrieval)
@@ -18,11 +35,16 @@ def get_splitter() -> RecursiveCharacterTextSplitter:
     """
     Configured recursive text splitter.
     Optimized for semantic + keyword hybrid retrieval.
+
+    Reference implementation; chunk_documents uses split_spans,
+    which yields the same chunks in "chars" mode.
     """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     return RecursiveCharacterTextSplitter(
         chunk_size=Config.CHUNK_SIZE,
         chunk_overlap=Config.CHUNK_OVERLAP,
-        separators=["\n\n", "\n", ".", " ", ""],
+        separators=SEPARATORS,
         strip_whitespace=True,
     )
 
@@ -31,33 +53,239 @@ def chunk_documents(documents: List[Document]) -> List[Document]:
     """
     Splits documents into chunks and preserves metadata.
     """
+    return chunk_documents_limited(documents)[0]
+
+
+def chunk_documents_limited(documents: List[Document]) -> Tuple[List[Document], int]:
+    """
+    chunk_documents() plus the number of chunks dropped by the
+    Config.MAX_TOTAL_CHUNKS safety limit, so callers can report
+    a partially indexed batch (e.g. a long playlist).
+    """
 
     logger.info(f"Chunking {len(documents)} documents")
 
-    splitter = get_splitter()
-    chunks = splitter.split_documents(documents)
-    # SAFETY LIMIT
-    MAX_TOTAL_CHUNKS = 100
-    if len(chunks) > MAX_TOTAL_CHUNKS:
-        logger.warning(f"Too many chunks ({len(chunks)}). Limiting to {MAX_TOTAL_CHUNKS}.")
-        chunks = chunks[:MAX_TOTAL_CHUNKS]
+    with span("chunk", documents=len(documents)) as stage:
+        enriched_chunks, dropped = _split_and_enrich(documents)
+        stage["chunks"] = len(enriched_chunks)
+        stage["dropped"] = dropped
 
+    logger.info(f"Created {len(enriched_chunks)} chunks")
 
-    enriched_chunks = []
+    return enriched_chunks, dropped
 
-    for chunk in chunks:
-        metadata = chunk.metadata.copy()
 
-        # Ensure consistent metadata
-        metadata["chunk_id"] = str(uuid.uuid4())
+def _split_and_enrich(documents: List[Document]) -> Tuple[List[Document], int]:
+    from langchain_core.documents import Document
 
-        enriched_chunks.append(
-            Document(
-                page_content=chunk.page_content.strip(),
-                metadata=metadata,
-            )
+    texts = [doc.page_content for doc in documents]
+    all_spans = split_texts(texts)
+
+    # SAFETY LIMIT (applied before any chunk text is copied)
+    total = sum(len(spans) for spans in all_spans)
+    dropped = max(total - Config.MAX_TOTAL_CHUNKS, 0)
+    if dropped:
+        logger.warning(
+            f"Too many chunks ({total}). Limiting to {Config.MAX_TOTAL_CHUNKS}, "
+            f"dropping {dropped}."
         )
 
-    logger.info(f"Created {len(enriched_chunks)} chunks")
+    enriched_chunks = []
+
+    for doc, text, spans in zip(documents, texts, all_spans):
+        for start, end in spans:
+            if len(enriched_chunks) >= Config.MAX_TOTAL_CHUNKS:
+                return enriched_chunks, dropped
+
+            # One metadata dict per chunk (needs its own chunk_id);
+            # the only text copy is the final slice.
+            enriched_chunks.append(
+                Document(
+                    page_content=text[start:end],
+                    metadata={
+                        **doc.metadata,
+                        "chunk_id": str(uuid.uuid4()),
+                        "start_index": start,
+                    },
+                )
+            )
+
+    return enriched_chunks, dropped
+
+
+# ==========================================================
+# Span Splitter (offsets, no intermediate strings)
+# ==========================================================
+
+def split_texts(texts: Sequence[str]) -> List[List[Span]]:
+    """
+    Chunk spans for every text, using a process pool when the
+    input is large enough to amortize worker start-up.
+    """
+    unit = Config.CHUNK_SIZE_UNIT
+    chunk_size, chunk_overlap = chunk_limits(unit)
+    args = [(text, chunk_size, chunk_overlap, unit) for text in texts]
+
+    total_chars = sum(len(text) for text in texts)
+
+    import multiprocessing
+
+    workers = min(Config.CHUNK_WORKERS or multiprocessing.cpu_count(), len(texts))
+
+    if workers < 2 or total_chars < Config.CHUNK_PARALLEL_MIN_CHARS:
+        return [_split_task(a) for a in args]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    logger.info(f"Chunking {total_chars} chars in {workers} processes")
+
+    # spawn: safe from Streamlit / ingestion worker threads
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        return list(pool.map(_split_task, args, chunksize=max(1, len(args) // (4 * workers))))
+
+
+def chunk_limits(unit: str) -> Tuple[int, int]:
+    """
+    (chunk_size, chunk_overlap) in the given unit. Token sizing is
+    capped at the embedding model's input limit.
+    """
+    if unit == "chars":
+        return Config.CHUNK_SIZE, Config.CHUNK_OVERLAP
+    if unit == "tokens":
+        size = min(Config.CHUNK_SIZE_TOKENS, Config.EMBEDDING_MAX_TOKENS)
+        return size, min(Config.CHUNK_OVERLAP_TOKENS, size - 1)
+    raise ValueError(f"Unsupported CHUNK_SIZE_UNIT: {unit}")
+
+
+def _split_task(args) -> List[Span]:
+    text, chunk_size, chunk_overlap, unit = args
+    length = token_length(text) if unit == "tokens" else None
+    return split_spans(text, chunk_size, chunk_overlap, length=length)
+
+
+def token_length(text: str) -> Callable[[int, int], int]:
+    """
+    Estimated token count of text[start:end] via bisection over
+    precomputed token start offsets.
+    """
+    starts = [m.start() for m in _TOKEN_PATTERN.finditer(text)]
+
+    def length(start: int, end: int) -> int:
+        return bisect.bisect_left(starts, end) - bisect.bisect_left(starts, start)
+
+    return length
+
+
+def split_spans(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    separators: Sequence[str] = SEPARATORS,
+    length: Optional[Callable[[int, int], int]] = None,
+) -> List[Span]:
+    """
+    Recursive character splitting over offsets.
+
+    Same boundaries as RecursiveCharacterTextSplitter with
+    keep_separator=True and strip_whitespace=True, but works on
+    (start, end) spans of the original text, so no substring is
+    created until a chunk is materialized.
+    """
+    if length is None:
+        def length(start: int, end: int) -> int:
+            return end - start
+
+    out: List[Span] = []
+
+    def strip(start: int, end: int) -> Optional[Span]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
+
+    def merge(splits: List[Span]) -> None:
+        # Splits are contiguous, so a merged chunk is simply
+        # (first start, last end); the joiner is "" (separators
+        # stay attached to the following split).
+        current: deque = deque()
+        total = 0
+
+        for start, end in splits:
+            size = length(start, end)
+
+            if total + size > chunk_size:
+                if total > chunk_size:
+                    logger.warning(
+                        f"Created a chunk of size {total}, "
+                        f"which is longer than the specified {chunk_size}"
+                    )
+                if current:
+                    chunk = strip(current[0][0], current[-1][1])
+                    if chunk is not None:
+                        out.append(chunk)
+
+                    while total > chunk_overlap or (total + size > chunk_size and total > 0):
+                        first = current.popleft()
+                        total -= length(*first)
+
+            current.append((start, end))
+            total += size
+
+        if current:
+            chunk = strip(current[0][0], current[-1][1])
+            if chunk is not None:
+                out.append(chunk)
+
+    def pieces(lo: int, hi: int, separator: str) -> List[Span]:
+        if not separator:
+            return [(i, i + 1) for i in range(lo, hi)]
+
+        # Boundaries at each non-overlapping separator occurrence;
+        # the separator starts the following piece.
+        cuts = [lo]
+        pos = text.find(separator, lo, hi)
+        while pos != -1:
+            cuts.append(pos)
+            pos = text.find(separator, pos + len(separator), hi)
+        cuts.append(hi)
+
+        return [(a, b) for a, b in zip(cuts, cuts[1:]) if a < b]
+
+    def split(lo: int, hi: int, seps: Sequence[str]) -> None:
+        separator = seps[-1]
+        remaining: Sequence[str] = []
+
+        for i, candidate in enumerate(seps):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, lo, hi) != -1:
+                separator = candidate
+                remaining = seps[i + 1 :]
+                break
+
+        good: List[Span] = []
+
+        for start, end in pieces(lo, hi, separator):
+            if length(start, end) < chunk_size:
+                good.append((start, end))
+                continue
+
+            if good:
+                merge(good)
+                good = []
+
+            if not remaining:
+                out.append((start, end))
+            else:
+                split(start, end, remaining)
+
+        if good:
+            merge(good)
 
-    return enriched_chunks
+    split(0, len(text), list(separators))
+    return out
@@ -0,0 +1,361 @@
+"""
+Compact append-only chunk store.
+
+One copy of every chunk, shared by the dense and keyword indices:
+
+- Text arena: all chunk texts as UTF-8 bytes in one buffer, with
+  an offsets array (chunk i = arena[offsets[i]:offsets[i + 1]])
+- Columnar metadata: per field, a dictionary of distinct values
+  and an int32 code per chunk (-1 = field absent)
+
+Indices refer to chunks by integer id; Documents are only built
+for the chunks actually returned. A saved store is reopened with
+its arrays memory-mapped, and further appends go to an in-memory
+tail. Appends never change existing ids, so copy-on-write index
+copies can share one store.
+
+Metadata filters are answered from packed per-value bitmaps built
+from the column codes on first use and cached, so they can be
+passed straight into FAISS (IDSelectorBitmap) and BM25 scoring.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from array import array
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = get_logger(__name__)
+
+_TEXT_FILE = "text.bin"
+_OFFSETS_FILE = "offsets.npy"
+_VALUES_FILE = "values.json"
+
+# {field: value or [values]}: fields are ANDed, listed values ORed;
+# a field with an empty list is ignored
+Filters = Dict[str, Any]
+
+
+def _value_key(value: Any) -> Tuple[type, Any]:
+    # Typed key: keeps 1, 1.0 and True distinct
+    return (type(value), value)
+
+
+# ==========================================================
+# Metadata Column
+# ==========================================================
+
+class _Column:
+    """
+    Dictionary-encoded metadata field.
+    """
+
+    def __init__(self, base_rows: int = 0, tail_rows: int = 0):
+        self.values: List[Any] = []
+        self._lookup: Dict[Tuple[type, Any], int] = {}
+        self.base: Optional[np.ndarray] = None  # codes of mapped rows (None = all absent)
+        self.base_rows = base_rows
+        self.tail = array("i", [-1] * tail_rows)
+
+    def encode(self, value: Any) -> int:
+        try:
+            key = _value_key(value)
+            code = self._lookup.get(key)
+        except TypeError:  # unhashable: stored without de-duplication
+            key, code = None, None
+
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            if key is not None:
+                self._lookup[key] = code
+
+        return code
+
+    def code(self, chunk_id: int) -> int:
+        if chunk_id < self.base_rows:
+            return -1 if self.base is None else int(self.base[chunk_id])
+        return self.tail[chunk_id - self.base_rows]
+
+    def codes(self, count: int) -> np.ndarray:
+        base = (
+            np.full(self.base_rows, -1, dtype=np.int32)
+            if self.base is None
+            else np.asarray(self.base, dtype=np.int32)
+        )
+        tail = np.array(self.tail[: count - self.base_rows], dtype=np.int32)
+        return np.concatenate([base, tail])
+
+
+# ==========================================================
+# Chunk Store
+# ==========================================================
+
+class ChunkStore:
+    """
+    Append-only chunk texts + columnar metadata, addressed by id.
+    """
+
+    def __init__(self):
+        # Memory-mapped part (after open()); empty for new stores
+        self._base_text = np.empty(0, dtype=np.uint8)
+        self._base_offsets = np.zeros(1, dtype=np.int64)
+        self._base_count = 0
+
+        # In-memory tail
+        self._text = bytearray()
+        self._offsets = array("q", [0])
+
+        self._columns: Dict[str, _Column] = {}
+        self._count = 0
+
+        # (field, value key) -> (rows covered, packed bitmap)
+        self._bitmaps: Dict[Tuple[str, Any], Tuple[int, np.ndarray]] = {}
+        self._code_cache: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self._columns)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Resident bytes for text, offsets and metadata codes
+        (memory-mapped pages excluded).
+        """
+        size = len(self._text) + self._offsets.itemsize * len(self._offsets)
+        for column in self._columns.values():
+            size += column.tail.itemsize * len(column.tail)
+        return size
+
+    # ------------------------------
+    # Append
+    # ------------------------------
+    def append(self, documents: Sequence[Document]) -> range:
+        """
+        Stores documents and returns their ids. Single writer
+        (callers hold IndexHandle.commit_lock); readers only touch
+        ids below len(), which is published last.
+        """
+        start = self._count
+
+        for doc in documents:
+            self._text.extend(doc.page_content.encode("utf-8"))
+            self._offsets.append(len(self._text))
+
+            for name in doc.metadata:
+                if name not in self._columns:
+                    self._columns[name] = _Column(
+                        self._base_count, self._count - self._base_count
+                    )
+
+            for name, column in self._columns.items():
+                if name in doc.metadata:
+                    column.tail.append(column.encode(doc.metadata[name]))
+                else:
+                    column.tail.append(-1)
+
+            self._count += 1
+
+        return range(start, self._count)
+
+    # ------------------------------
+    # Read
+    # ------------------------------
+    def text(self, chunk_id: int) -> str:
+        if chunk_id < self._base_count:
+            lo, hi = self._base_offsets[chunk_id], self._base_offsets[chunk_id + 1]
+            return self._base_text[lo:hi].tobytes().decode("utf-8")
+
+        row = chunk_id - self._base_count
+        return self._text[self._offsets[row] : self._offsets[row + 1]].decode("utf-8")
+
+    def texts(self, ids: Iterable[int]) -> List[str]:
+        return [self.text(i) for i in ids]
+
+    def metadata(self, chunk_id: int) -> Dict[str, Any]:
+        metadata = {}
+        # list(): a concurrent append may add a column
+        for name, column in list(self._columns.items()):
+            code = column.code(chunk_id)
+            if code >= 0:
+                metadata[name] = column.values[code]
+        return metadata
+
+    def document(self, chunk_id: int) -> Document:
+        from langchain_core.documents import Document
+
+        return Document(
+            page_content=self.text(chunk_id),
+            metadata=self.metadata(chunk_id),
+        )
+
+    def documents(self, ids: Iterable[int]) -> List[Document]:
+        return [self.document(i) for i in ids]
+
+    def column(self, name: str) -> Tuple[List[Any], np.ndarray]:
+        """
+        (distinct values, per-chunk codes) of a metadata field;
+        codes are -1 where the field is absent.
+        """
+        column = self._columns.get(name)
+        if column is None:
+            return [], np.full(self._count, -1, dtype=np.int32)
+        return list(column.values), column.codes(self._count)
+
+    def values(self, name: str, ids: Optional[np.ndarray] = None) -> List[Any]:
+        """
+        Distinct values of a metadata field, in first-seen order;
+        with `ids`, only values occurring among those chunks.
+        """
+        column = self._columns.get(name)
+        if column is None:
+            return []
+        if ids is None:
+            return list(column.values)
+
+        codes = np.unique(self._codes(name, self._count)[np.asarray(ids, dtype=np.int64)])
+        return [column.values[code] for code in codes if code >= 0]
+
+    # ------------------------------
+    # Bitmap Filters
+    # ------------------------------
+    def bitmap(self, name: str, value: Any) -> np.ndarray:
+        """
+        Packed bitmap (little bit order, one bit per chunk id) of
+        chunks whose `name` field equals `value`.
+        """
+        count = self._count
+        key = (name, _value_key(value))
+
+        cached = self._bitmaps.get(key)
+        if cached is not None and cached[0] == count:
+            return cached[1]
+
+        column = self._columns.get(name)
+        try:
+            code = column._lookup.get(key[1]) if column is not None else None
+        except TypeError:  # unhashable values are not filterable
+            code = None
+
+        if code is None:
+            bits = np.zeros((count + 7) // 8, dtype=np.uint8)
+        else:
+            bits = np.packbits(self._codes(name, count) == code, bitorder="little")
+
+        self._bitmaps[key] = (count, bits)
+        return bits
+
+    def _codes(self, name: str, count: int) -> np.ndarray:
+        """
+        Cached codes of a field, extended with rows appended since.
+        """
+        cached = self._code_cache.get(name)
+        if cached is None or len(cached) > count:
+            codes = self._columns[name].codes(count)
+        elif len(cached) < count:
+            column = self._columns[name]
+            tail = column.tail[len(cached) - column.base_rows : count - column.base_rows]
+            codes = np.concatenate([cached, np.array(tail, dtype=np.int32)])
+        else:
+            codes = cached
+
+        self._code_cache[name] = codes
+        return codes
+
+    def select(self, filters: Optional[Filters]) -> Optional[np.ndarray]:
+        """
+        Boolean mask over chunk ids matching `filters`, or None
+        when nothing is filtered.
+        """
+        count = self._count
+        selected = None
+
+        for name, wanted in (filters or {}).items():
+            if isinstance(wanted, (list, tuple, set, frozenset)):
+                if not wanted:
+                    continue
+            else:
+                wanted = [wanted]
+
+            field_bits = np.zeros((count + 7) // 8, dtype=np.uint8)
+            for value in wanted:
+                field_bits |= self.bitmap(name, value)[: len(field_bits)]
+
+            selected = field_bits if selected is None else selected & field_bits
+
+        if selected is None:
+            return None
+
+        return np.unpackbits(selected, count=count, bitorder="little").astype(bool)
+
+    # ------------------------------
+    # Persistence
+    # ------------------------------
+    def save(self, directory: str) -> None:
+        """
+        Writes the store as flat files that open() memory-maps.
+        """
+        os.makedirs(directory, exist_ok=True)
+        count = self._count
+
+        with open(os.path.join(directory, _TEXT_FILE), "wb") as f:
+            f.write(self._base_text.tobytes())
+            f.write(bytes(self._text[: self._offsets[count - self._base_count]]))
+
+        tail_offsets = np.array(self._offsets[1 : count - self._base_count + 1], dtype=np.int64)
+        offsets = np.concatenate([self._base_offsets, tail_offsets + self._base_offsets[-1]])
+        np.save(os.path.join(directory, _OFFSETS_FILE), offsets)
+
+        values = {}
+        for i, (name, column) in enumerate(self._columns.items()):
+            np.save(os.path.join(directory, f"codes_{i}.npy"), column.codes(count))
+            values[name] = column.values
+
+        with open(os.path.join(directory, _VALUES_FILE), "w", encoding="utf-8") as f:
+            json.dump(values, f)
+
+        logger.info(f"Saved {count} chunks to {directory}")
+
+    @classmethod
+    def open(cls, directory: str) -> "ChunkStore":
+        """
+        Reopens a saved store with text, offsets and codes
+        memory-mapped read-only.
+        """
+        store = cls()
+
+        store._base_offsets = np.load(os.path.join(directory, _OFFSETS_FILE), mmap_mode="r")
+        store._base_count = len(store._base_offsets) - 1
+
+        text_path = os.path.join(directory, _TEXT_FILE)
+        if os.path.getsize(text_path):
+            store._base_text = np.memmap(text_path, dtype=np.uint8, mode="r")
+
+        with open(os.path.join(directory, _VALUES_FILE), encoding="utf-8") as f:
+            values = json.load(f)
+
+        for i, (name, column_values) in enumerate(values.items()):
+            column = _Column(store._base_count)
+            column.values = column_values
+            for code, value in enumerate(column_values):
+                try:
+                    column._lookup.setdefault(_value_key(value), code)
+                except TypeError:
+                    pass
+            column.base = np.load(os.path.join(directory, f"codes_{i}.npy"), mmap_mode="r")
+            store._columns[name] = column
+
+        store._count = store._base_count
+        return store
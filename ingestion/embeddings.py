@@ -1,4 +1,3 @@
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from config import Config
 from utils.logger import get_logger
 
@@ -15,6 +14,8 @@ def get_embedding_model():
     global _embedding_instance
 
     if _embedding_instance is None:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
         try:
             logger.info(
                 f"Initializing Gemini Embeddings: {Config.EMBEDDING_MODEL}"
@@ -22,7 +23,8 @@ def get_embedding_model():
 
             _embedding_instance = GoogleGenerativeAIEmbeddings(
                 model=Config.EMBEDDING_MODEL,
-                google_api_key=Config.GOOGLE_API_KEY,
+                google_api_key=Config.require_api_key(),
+                output_dimensionality=Config.EMBEDDING_DIM,
             )
 
         except Exception as e:
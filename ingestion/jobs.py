@@ -0,0 +1,308 @@
+"""
+Background ingestion jobs.
+
+Loading, chunking and embedding run in worker threads (the slow
+parts are network-bound Gemini / HTTP calls that release the GIL).
+Each job publishes progress and throughput, can be cancelled, retries
+failing steps with backoff, and on completion atomically swaps
+copy-on-write updated indices into an IndexHandle, so queries keep
+using the current indices while new sources are embedding.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from ingestion.chunking import chunk_documents_limited
+from ingestion.vectorstore import embed_documents, index_embedded
+from utils.logger import get_logger
+from utils.tracing import get_metrics, start_trace
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from retrieval.dense import DenseIndex
+    from retrieval.keyword import KeywordIndex
+
+logger = get_logger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Zero-argument callable returning documents, e.g.
+# functools.partial(load_web, url)
+SourceLoader = Callable[[], List["Document"]]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ==========================================================
+# Index Handle (atomic swap)
+# ==========================================================
+
+class IndexHandle:
+    """
+    Holds the live (vectorstore, bm25) pair. Readers take a
+    snapshot; writers build updated copies and swap the pair in
+    with a single reference assignment, so a reader sees either
+    the old or the new indices, never a partial update.
+    """
+
+    def __init__(self, vectorstore=None, bm25=None):
+        self.commit_lock = threading.Lock()  # serializes writers
+        self._indices = (vectorstore, bm25)
+        self.version = 0
+
+    def snapshot(self) -> Tuple[Optional[DenseIndex], Optional[KeywordIndex]]:
+        return self._indices
+
+    def swap(self, vectorstore, bm25) -> None:
+        self._indices = (vectorstore, bm25)
+        self.version += 1
+
+
+# ==========================================================
+# Job
+# ==========================================================
+
+class IngestionJob:
+    """
+    State of one submitted batch of sources.
+    """
+
+    def __init__(self, label: str, loaders: List[SourceLoader]):
+        self.id = uuid.uuid4().hex[:8]
+        self.label = label
+        self.loaders = loaders
+
+        self.status = PENDING
+        self.stage = "queued"
+        self.error: Optional[str] = None
+        self.retries = 0
+
+        self.sources_done = 0
+        self.chunks_total = 0
+        self.chunks_dropped = 0  # over Config.MAX_TOTAL_CHUNKS
+        self.chunks_embedded = 0
+        self.chunks_per_second = 0.0
+
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.trace: Optional[Dict] = None
+
+        self._cancel = threading.Event()
+
+    @property
+    def progress(self) -> float:
+        """
+        0..1: loading counts for the first 20%, embedding for the rest.
+        """
+        if self.status == SUCCEEDED:
+            return 1.0
+
+        load = self.sources_done / max(len(self.loaders), 1)
+        embed = self.chunks_embedded / self.chunks_total if self.chunks_total else 0.0
+        return round(0.2 * load + 0.8 * embed, 3)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED, CANCELLED)
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "chunks_total": self.chunks_total,
+            "chunks_dropped": self.chunks_dropped,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_per_second": self.chunks_per_second,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+
+# ==========================================================
+# Scheduler
+# ==========================================================
+
+class IngestionScheduler:
+    """
+    Runs ingestion jobs on a bounded thread pool against one
+    IndexHandle.
+    """
+
+    def __init__(
+        self,
+        handle: IndexHandle,
+        max_workers: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.handle = handle
+        self.max_retries = Config.INGEST_MAX_RETRIES if max_retries is None else max_retries
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.INGEST_WORKERS,
+            thread_name_prefix="ingest",
+        )
+        self._jobs: Dict[str, IngestionJob] = {}
+
+    def submit(self, label: str, loaders: List[SourceLoader]) -> IngestionJob:
+        job = IngestionJob(label, loaders)
+        self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+
+        logger.info(f"Queued ingestion job {job.id}: {label}")
+        return job
+
+    def jobs(self) -> List[IngestionJob]:
+        return list(self._jobs.values())
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def clear_finished(self) -> None:
+        for job_id in [j.id for j in self._jobs.values() if j.done]:
+            del self._jobs[job_id]
+
+    def shutdown(self, cancel: bool = True, wait: bool = False) -> None:
+        if cancel:
+            for job in self._jobs.values():
+                job.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=cancel)
+
+    # ------------------------------
+    # Worker
+    # ------------------------------
+    def _run(self, job: IngestionJob) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+
+        try:
+            with start_trace(f"ingestion:{job.id}") as trace:
+                self._execute(job)
+            job.trace = trace.to_dict()
+            job.status = SUCCEEDED
+            job.stage = "done"
+
+        except JobCancelled:
+            job.status = CANCELLED
+            job.stage = "cancelled"
+            logger.info(f"Ingestion job {job.id} cancelled")
+
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            logger.error(f"Ingestion job {job.id} failed: {e}")
+
+        finally:
+            job.finished_at = time.time()
+            get_metrics().inc("rag_ingest_jobs_total", status=job.status)
+
+    def _execute(self, job: IngestionJob) -> None:
+        # ---------------------------
+        # Load
+        # ---------------------------
+        job.stage = "loading"
+        documents: List[Document] = []
+
+        for loader in job.loaders:
+            job.check_cancelled()
+            documents.extend(self._with_retries(job, loader))
+            job.sources_done += 1
+
+        if not documents:
+            raise ValueError("No content could be loaded from the sources.")
+
+        # ---------------------------
+        # Chunk
+        # ---------------------------
+        job.check_cancelled()
+        job.stage = "chunking"
+        chunks, job.chunks_dropped = chunk_documents_limited(documents)
+        job.chunks_total = len(chunks)
+        if job.chunks_dropped:
+            logger.warning(
+                f"Ingestion job {job.id} dropped {job.chunks_dropped} chunks "
+                f"over MAX_TOTAL_CHUNKS ({Config.MAX_TOTAL_CHUNKS})"
+            )
+
+        # ---------------------------
+        # Embed (batched for progress + cancellation)
+        # ---------------------------
+        job.stage = "embedding"
+        vectors = []
+        started = time.perf_counter()
+        batch_size = Config.INGEST_EMBED_BATCH
+
+        for start in range(0, len(chunks), batch_size):
+            job.check_cancelled()
+            batch = chunks[start : start + batch_size]
+
+            _, batch_vectors = self._with_retries(job, lambda: embed_documents(batch))
+            vectors.extend(batch_vectors)
+
+            job.chunks_embedded += len(batch)
+            elapsed = time.perf_counter() - started
+            job.chunks_per_second = round(job.chunks_embedded / elapsed, 2) if elapsed else 0.0
+
+        # ---------------------------
+        # Index + atomic swap
+        # ---------------------------
+        job.check_cancelled()
+        job.stage = "indexing"
+
+        with self.handle.commit_lock:
+            vectorstore, bm25 = self.handle.snapshot()
+            vectorstore, bm25 = index_embedded(
+                chunks, vectors, vectorstore, bm25, copy=True
+            )
+            self.handle.swap(vectorstore, bm25)
+
+        logger.info(f"Ingestion job {job.id} indexed {len(chunks)} chunks")
+
+    def _with_retries(self, job: IngestionJob, step: Callable):
+        attempt = 0
+
+        while True:
+            try:
+                return step()
+            except JobCancelled:
+                raise
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+
+                job.retries += 1
+                delay = Config.INGEST_RETRY_BACKOFF * (2 ** (attempt - 1))
+                logger.warning(
+                    f"Job {job.id} step failed ({e}); retry {attempt} in {delay:.1f}s"
+                )
+
+                # Wake up early if the job is cancelled meanwhile
+                if job._cancel.wait(delay):
+                    raise JobCancelled()
@@ -1,18 +1,58 @@
+from __future__ import annotations
+
 import io
-import requests
-import pandas as pd
-from typing import List
+import os
 import time
+from typing import TYPE_CHECKING, Callable, Dict, List
 from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
-from langchain_community.document_loaders import YoutubeLoader
-from langchain_core.documents import Document
 
 from config import Config
 from utils.logger import get_logger
+from utils.tracing import span
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 
 logger = get_logger(__name__)
 
+# Parsing dependencies (PyMuPDF, python-docx, pandas, requests,
+# BeautifulSoup, youtube-transcript-api, LangChain documents) are imported
+# inside the loader that needs them, so importing this module and
+# re-running the Streamlit script stay cheap.
+
+
+def _document(page_content: str, metadata: dict) -> Document:
+    from langchain_core.documents import Document
+
+    return Document(page_content=page_content, metadata=metadata)
+
+
+# ==========================================================
+# LOADER REGISTRY (file extension -> loader)
+# ==========================================================
+
+FILE_LOADERS: Dict[str, Callable[..., List[Document]]] = {}
+
+
+def register_loader(*extensions: str):
+    """
+    Registers a file loader for one or more extensions (".pdf").
+    """
+
+    def decorator(func):
+        for ext in extensions:
+            FILE_LOADERS[ext.lower()] = func
+        return func
+
+    return decorator
+
+
+def supported_file_types() -> List[str]:
+    """
+    Extensions accepted by load_uploaded_file, without the dot.
+    """
+    return [ext.lstrip(".") for ext in FILE_LOADERS]
+
 
 # ==========================================================
 # GENERIC FILE LOADER (PDF, TXT, DOCX, CSV)
@@ -25,27 +65,39 @@ def load_uploaded_file(uploaded_file) -> List[Document]:
     """
 
     file_name = uploaded_file.name.lower()
+    ext = os.path.splitext(file_name)[1]
 
-    if file_name.endswith(".pdf"):
-        return load_pdf(uploaded_file)
+    loader = FILE_LOADERS.get(ext)
+    if loader is None:
+        raise ValueError(f"Unsupported file type: {file_name}")
 
-    elif file_name.endswith(".txt"):
-        return load_txt(uploaded_file)
+    with span("load", source_type=ext.lstrip(".")) as stage:
+        docs = loader(uploaded_file)
+        stage["documents"] = len(docs)
 
-    elif file_name.endswith(".docx"):
-        return load_docx(uploaded_file)
+    return docs
 
-    elif file_name.endswith(".csv"):
-        return load_csv(uploaded_file)
 
-    else:
-        raise ValueError(f"Unsupported file type: {file_name}")
+def uploaded_file_loader(name: str, data: bytes) -> Callable[[], List[Document]]:
+    """
+    Zero-argument loader over captured upload bytes, for background
+    jobs: Streamlit upload objects do not outlive the script run,
+    and each call (e.g. a retry) reads from a fresh buffer.
+    """
+
+    def load() -> List[Document]:
+        buffer = io.BytesIO(data)
+        buffer.name = name
+        return load_uploaded_file(buffer)
+
+    return load
 
 
 # ==========================================================
 # PDF
 # ==========================================================
 
+@register_loader(".pdf")
 def load_pdf(uploaded_file) -> List[Document]:
     import fitz  # PyMuPDF
 
@@ -57,7 +109,7 @@ def load_pdf(uploaded_file) -> List[Document]:
         text = page.get_text("text")
         if text.strip():
             docs.append(
-                Document(
+                _document(
                     page_content=text,
                     metadata={
                         "source_type": "pdf",
@@ -75,11 +127,12 @@ def load_pdf(uploaded_file) -> List[Document]:
 # TXT
 # ==========================================================
 
+@register_loader(".txt")
 def load_txt(uploaded_file) -> List[Document]:
     content = uploaded_file.read().decode("utf-8", errors="ignore")
 
     return [
-        Document(
+        _document(
             page_content=content,
             metadata={
                 "source_type": "txt",
@@ -93,6 +146,7 @@ def load_txt(uploaded_file) -> List[Document]:
 # DOCX
 # ==========================================================
 
+@register_loader(".docx")
 def load_docx(uploaded_file) -> List[Document]:
     from docx import Document as DocxDocument
 
@@ -102,7 +156,7 @@ def load_docx(uploaded_file) -> List[Document]:
     text = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
 
     return [
-        Document(
+        _document(
             page_content=text,
             metadata={
                 "source_type": "docx",
@@ -116,13 +170,16 @@ def load_docx(uploaded_file) -> List[Document]:
 # CSV
 # ==========================================================
 
+@register_loader(".csv")
 def load_csv(uploaded_file) -> List[Document]:
+    import pandas as pd
+
     df = pd.read_csv(uploaded_file)
 
     text = df.to_string(index=False)
 
     return [
-        Document(
+        _document(
             page_content=text,
             metadata={
                 "source_type": "csv",
@@ -136,51 +193,35 @@ def load_csv(uploaded_file) -> List[Document]:
 # YOUTUBE (Transcript Only)
 # ==========================================================
 
-# ==========================================================
-# YOUTUBE (LangChain Loader)
-# ==========================================================
-
-from langchain_community.document_loaders import YoutubeLoader
-
-
 def load_youtube(url: str) -> List[Document]:
     """
-    Loads YouTube transcript using LangChain's YoutubeLoader.
+    Loads one video's transcript as timestamped segments.
     Uses transcript only (no audio processing).
+    See ingestion.youtube for multi-video / playlist loading.
     """
+    from ingestion.youtube import load_youtube_videos
 
-    try:
-        loader = YoutubeLoader.from_youtube_url(
-            url,
-            add_video_info=False,
-            language=["en"],
-        )
-
-        documents = loader.load()
+    documents = load_youtube_videos([url])
 
-        # Enrich metadata
-        for doc in documents:
-            doc.metadata["source_type"] = "youtube"
+    logger.info(f"Loaded YouTube transcript: {url}")
 
-        logger.info(f"Loaded YouTube transcript: {url}")
+    return documents
 
-        return documents
-
-    except Exception as e:
-        logger.warning(f"YouTube loading failed: {e}")
-        raise ValueError(
-            "Could not fetch YouTube transcript. "
-            "YouTube may be blocking cloud requests."
-        )
 
 # ==========================================================
 # SIMPLE WEB LOADER (NO HEAVY RECURSION)
 # ==========================================================
 
-
-
-
 def load_web(url: str, depth: int = 0, visited=None) -> List[Document]:
+    """
+    Loads a page and, up to MAX_CRAWL_DEPTH, same-domain pages it
+    links to. Errors on the starting page propagate (so a background
+    job retries or fails it); pages found while crawling that fail
+    are logged and skipped.
+    """
+    import requests
+    from bs4 import BeautifulSoup
+
     if visited is None:
         visited = set()
 
@@ -202,15 +243,16 @@ def load_web(url: str, depth: int = 0, visited=None) -> List[Document]:
             "Accept-Language": "en-US,en;q=0.9",
         }
 
-        response = requests.get(
-            url,
-            headers=headers,
-            timeout=Config.REQUEST_TIMEOUT,
-        )
+        with span("load", source_type="web", depth=depth):
+            response = requests.get(
+                url,
+                headers=headers,
+                timeout=Config.REQUEST_TIMEOUT,
+            )
 
-        response.raise_for_status()
+            response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, "html.parser")
+            soup = BeautifulSoup(response.text, "html.parser")
 
         # Remove noisy tags
         for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
@@ -220,7 +262,7 @@ def load_web(url: str, depth: int = 0, visited=None) -> List[Document]:
         text = "\n".join(line.strip() for line in text.splitlines() if line.strip())
 
         documents = [
-            Document(
+            _document(
                 page_content=text,
                 metadata={
                     "source_type": "web",
@@ -254,9 +296,13 @@ def load_web(url: str, depth: int = 0, visited=None) -> List[Document]:
         return documents
 
     except requests.exceptions.HTTPError as e:
+        if depth == 0:
+            raise
         logger.warning(f"HTTP error while scraping {url}: {e}")
         return []
 
     except Exception as e:
+        if depth == 0:
+            raise
         logger.warning(f"Web scrape failed for {url}: {e}")
         return []
@@ -0,0 +1,298 @@
+"""
+Compact embedding storage with exact rescoring.
+
+Vectors are held in RAM as float16 or int8 scalar-quantized codes
+(FAISS IndexScalarQuantizer). Full-precision float32 copies live in
+an on-disk memmap and are only read to rescore the coarse shortlist,
+so resident memory drops 2x (float16) or 4x (int8), and further
+with a reduced embedding dimension.
+"""
+
+import os
+import tempfile
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+# Rows per block when re-encoding int8 codes after a range change
+_REENCODE_BLOCK = 65536
+
+
+# ==========================================================
+# Helpers
+# ==========================================================
+
+def truncate_and_normalize(vectors: np.ndarray, dim: Optional[int]) -> np.ndarray:
+    """
+    Keeps the first `dim` components (Matryoshka-style) and
+    re-normalizes to unit length.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dim is not None:
+        vectors = vectors[:, :dim]
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def _scalar_quantizer(dim: int, storage: str):
+    import faiss
+
+    qtypes = {
+        "float16": faiss.ScalarQuantizer.QT_fp16,
+        "int8": faiss.ScalarQuantizer.QT_8bit,
+    }
+    if storage not in qtypes:
+        raise ValueError(
+            f"Unsupported compact storage '{storage}'. "
+            f"Expected one of {sorted(qtypes)}."
+        )
+
+    return faiss.IndexScalarQuantizer(dim, qtypes[storage], faiss.METRIC_INNER_PRODUCT)
+
+
+# ==========================================================
+# Full-Precision Store (disk-backed)
+# ==========================================================
+
+class FullPrecisionStore:
+    """
+    Append-only float32 matrix in a file, read through np.memmap.
+    """
+
+    def __init__(self, dim: int, directory: Optional[str] = None):
+        self.dim = dim
+        self.count = 0
+
+        fd, self.path = tempfile.mkstemp(
+            prefix="rescore_", suffix=".f32", dir=directory
+        )
+        os.close(fd)
+        self._mmap = None
+        self._finalizer = weakref.finalize(self, _remove_file, self.path)
+
+    def append(self, vectors: np.ndarray) -> None:
+        with open(self.path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+        self.count += len(vectors)
+        self._mmap = None  # re-map lazily with the new size
+
+    def get(self, ids: Sequence[int]) -> np.ndarray:
+        if self._mmap is None:
+            self._mmap = np.memmap(
+                self.path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self.count, self.dim),
+            )
+        return np.asarray(self._mmap[np.asarray(ids, dtype=np.int64)])
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ==========================================================
+# Compact Index (faiss.Index compatible subset)
+# ==========================================================
+
+class CompactVectorIndex:
+    """
+    Inner-product index over quantized codes with exact rescoring.
+
+    Exposes the part of the faiss.Index API used by LangChain's
+    FAISS wrapper (d, ntotal, is_trained, add, search, reconstruct),
+    so it can be passed as `index=` to FAISS(...).
+
+    Inputs are L2-normalized on add and search, so scores are
+    cosine similarities. int8 ranges are trained on the first
+    batch added and widened (all codes re-encoded from the
+    full-precision copy) when a later batch falls outside them.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        storage: str = "int8",
+        rescore_factor: int = 4,
+        directory: Optional[str] = None,
+    ):
+        self.storage = storage
+        self.rescore_factor = max(1, rescore_factor)
+        self.index = _scalar_quantizer(dim, storage)
+        self.full = FullPrecisionStore(dim, directory)
+
+    @property
+    def d(self) -> int:
+        return self.index.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def is_trained(self) -> bool:
+        return True  # trained lazily on first add
+
+    @property
+    def code_bytes(self) -> int:
+        """
+        Resident bytes used by the compact codes.
+        """
+        return self.index.sa_code_size() * self.ntotal
+
+    def add(self, x: np.ndarray) -> None:
+        x = truncate_and_normalize(x, None)
+
+        if not self.index.is_trained:
+            self.index.train(x)
+        elif self.storage == "int8":
+            self._widen_ranges(x)
+
+        self.index.add(x)
+        self.full.append(x)
+
+    def _widen_ranges(self, x: np.ndarray) -> None:
+        """
+        Re-encodes the int8 codes with per-dimension ranges that
+        cover `x`. Clipped codes would otherwise lose recall for
+        good: rescoring only sees what the coarse search returns.
+        """
+        import faiss
+
+        d = self.d
+        trained = faiss.vector_to_array(self.index.sq.trained)  # [vmin, vdiff]
+        vmin, vmax = trained[:d], trained[:d] + trained[d:]
+
+        low, high = x.min(axis=0), x.max(axis=0)
+        if np.all(low >= vmin) and np.all(high <= vmax):
+            return
+
+        # Headroom on widened dimensions, so a slowly drifting
+        # corpus does not re-encode on every batch
+        margin = 0.1 * (np.maximum(vmax, high) - np.minimum(vmin, low))
+        vmin = np.where(low < vmin, low - margin, vmin)
+        vmax = np.where(high > vmax, high + margin, vmax)
+
+        index = _scalar_quantizer(d, self.storage)
+        faiss.copy_array_to_vector(
+            np.concatenate([vmin, vmax - vmin]).astype(np.float32), index.sq.trained
+        )
+        index.is_trained = True
+
+        for start in range(0, self.ntotal, _REENCODE_BLOCK):
+            stop = min(start + _REENCODE_BLOCK, self.ntotal)
+            index.add(self.full.get(np.arange(start, stop)))
+
+        logger.info(f"Widened int8 ranges; re-encoded {self.ntotal} vectors")
+        self.index = index
+
+    def search(self, x: np.ndarray, k: int, params=None):
+        """
+        Coarse top (k * rescore_factor) on codes, then exact
+        inner-product rescoring of that shortlist.
+        """
+        x = truncate_and_normalize(x, None)
+        n = len(x)
+
+        scores = np.full((n, k), -np.inf, dtype=np.float32)
+        ids = np.full((n, k), -1, dtype=np.int64)
+
+        if self.ntotal == 0:
+            return scores, ids
+
+        shortlist_size = min(self.ntotal, k * self.rescore_factor)
+        if params is None:
+            _, shortlist = self.index.search(x, shortlist_size)
+        else:
+            _, shortlist = self.index.search(x, shortlist_size, params=params)
+
+        for row in range(n):
+            candidates = shortlist[row][shortlist[row] >= 0]
+            if len(candidates) == 0:
+                continue
+
+            exact = self.full.get(candidates) @ x[row]
+            order = np.argsort(-exact)[:k]
+
+            scores[row, : len(order)] = exact[order]
+            ids[row, : len(order)] = candidates[order]
+
+        return scores, ids
+
+    def reconstruct(self, key: int) -> np.ndarray:
+        return self.full.get([key])[0]
+
+
+# ==========================================================
+# Recall vs Memory Report
+# ==========================================================
+
+def recall_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    dims: Iterable[Optional[int]] = (None,),
+    storages: Iterable[str] = STORAGE_TYPES,
+    rescore_factor: int = 4,
+) -> List[Dict]:
+    """
+    Recall@k of each (dimension, storage) setting against exact
+    full-dimension float32 search, with resident bytes per vector.
+    """
+    base = truncate_and_normalize(vectors, None)
+    base_queries = truncate_and_normalize(queries, None)
+    full_dim = base.shape[1]
+
+    truth = np.argsort(-(base_queries @ base.T), axis=1)[:, :k]
+    rows = []
+
+    for dim in dims:
+        corpus = truncate_and_normalize(vectors, dim)
+        q = truncate_and_normalize(queries, dim)
+        d = corpus.shape[1]
+
+        for storage in storages:
+            if storage == "float32":
+                found = np.argsort(-(q @ corpus.T), axis=1)[:, :k]
+                coarse = found
+                bytes_per_vector = 4 * d
+            else:
+                index = CompactVectorIndex(d, storage, rescore_factor)
+                index.add(corpus)
+                _, coarse = index.index.search(q, k)
+                _, found = index.search(q, k)
+                bytes_per_vector = index.index.sa_code_size()
+
+            rows.append(
+                {
+                    "dim": d,
+                    "storage": storage,
+                    "bytes_per_vector": bytes_per_vector,
+                    "memory_ratio": round(4 * full_dim / bytes_per_vector, 2),
+                    "recall_coarse": _recall(coarse, truth),
+                    "recall_rescored": _recall(found, truth),
+                }
+            )
+
+    return rows
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(
+        len(set(f.tolist()) & set(t.tolist()))
+        for f, t in zip(found, truth)
+    )
+    return round(hits / truth.size, 4)
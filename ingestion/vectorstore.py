@@ -1,27 +1,51 @@
-from typing import List, Tuple
+from __future__ import annotations
 
-from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-from langchain_community.retrievers import BM25Retriever
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from config import Config
 from ingestion.embeddings import get_embedding_model
 from utils.logger import get_logger
+from utils.tracing import record_embedding_input, span
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from retrieval.dense import DenseIndex
+    from retrieval.keyword import KeywordIndex
 
 logger = get_logger(__name__)
 
 
+# ==========================================================
+# Embedding (timed separately from indexing)
+# ==========================================================
+
+def embed_documents(
+    documents: List[Document],
+) -> Tuple[List[str], List[List[float]]]:
+    """
+    Embeds chunk texts in one batched call.
+    """
+
+    texts = [doc.page_content for doc in documents]
+
+    with span("embed", chunks=len(texts)):
+        record_embedding_input(Config.EMBEDDING_MODEL, texts)
+        vectors = get_embedding_model().embed_documents(texts)
+
+    return texts, vectors
+
+
 # ==========================================================
 # Build In-Memory Indices (Session-Based)
 # ==========================================================
 
 def build_indices(
     documents: List[Document],
-) -> Tuple[FAISS, BM25Retriever]:
+) -> Tuple[DenseIndex, KeywordIndex]:
     """
     Builds in-memory:
-    - FAISS vector index (semantic search)
-    - BM25 retriever (keyword search)
+    - Dense FAISS index with native MMR (semantic search)
+    - BM25 keyword index (keyword search)
 
     No disk persistence.
     Designed for interactive RAG.
@@ -32,21 +56,8 @@ def build_indices(
 
     logger.info(f"Building indices for {len(documents)} chunks")
 
-    embeddings = get_embedding_model()
-
-    # ---------------------------
-    # Dense Vector Index (FAISS)
-    # ---------------------------
-    vectorstore = FAISS.from_documents(
-        documents,
-        embedding=embeddings,
-    )
-
-    # ---------------------------
-    # Keyword Index (BM25)
-    # ---------------------------
-    bm25 = BM25Retriever.from_documents(documents)
-    bm25.k = Config.FETCH_K  # Fetch more before hybrid fusion
+    texts, vectors = embed_documents(documents)
+    vectorstore, bm25 = index_embedded(documents, vectors)
 
     logger.info("FAISS + BM25 indices built successfully")
 
@@ -58,15 +69,15 @@ def build_indices(
 # ==========================================================
 
 def add_documents(
-    vectorstore: FAISS,
-    bm25: BM25Retriever,
+    vectorstore: DenseIndex,
+    bm25: KeywordIndex,
     new_documents: List[Document],
-) -> Tuple[FAISS, BM25Retriever]:
+) -> Tuple[DenseIndex, KeywordIndex]:
     """
     Adds new documents to in-memory indices.
 
-    FAISS supports incremental updates.
-    BM25 must be rebuilt.
+    The chunks are appended to the shared store once; both indices
+    append their ids in place.
     """
 
     if not new_documents:
@@ -74,13 +85,8 @@ def add_documents(
 
     logger.info(f"Adding {len(new_documents)} new chunks")
 
-    # Update FAISS
-    vectorstore.add_documents(new_documents)
-
-    # Rebuild BM25 (required — no incremental update support)
-    all_docs = bm25.docs + new_documents
-    bm25 = BM25Retriever.from_documents(all_docs)
-    bm25.k = Config.FETCH_K
+    texts, vectors = embed_documents(new_documents)
+    vectorstore, bm25 = index_embedded(new_documents, vectors, vectorstore, bm25)
 
     logger.info("Indices updated successfully")
 
@@ -88,19 +94,72 @@ def add_documents(
 
 
 # ==========================================================
-# Dense Retriever (MMR for Diversity)
+# Index Pre-Embedded Chunks
 # ==========================================================
 
-def get_dense_retriever(vectorstore: FAISS):
+def index_embedded(
+    documents: List[Document],
+    vectors,
+    vectorstore: Optional[DenseIndex] = None,
+    bm25: Optional[KeywordIndex] = None,
+    copy: bool = False,
+) -> Tuple[DenseIndex, KeywordIndex]:
     """
-    Returns MMR-based dense retriever.
-    Helps reduce redundancy.
+    Adds already-embedded chunks to the indices, creating them
+    when None. Chunks are stored once in the shared ChunkStore and
+    both indices reference them by id.
+
+    copy=True extends views (see DenseIndex.copy) and leaves the
+    given indices answering over the chunks they had, so concurrent
+    readers never see a half-applied update. Views share the
+    append-only store and index storage, so this does not copy
+    the corpus.
+
+    With Config.INDEX_SHARDS > 1 the vectors and postings live in
+    shard processes (ShardedIndex) and bm25 is its keyword view.
     """
+    from ingestion.chunkstore import ChunkStore
+    from retrieval.dense import DenseIndex
+    from retrieval.keyword import KeywordIndex
+
+    if len(vectors) != len(documents):
+        raise ValueError("documents and vectors must have the same length")
+
+    with span("index", chunks=len(documents)):
+        # ---------------------------
+        # Chunk Store (single copy of text + metadata)
+        # ---------------------------
+        store = vectorstore.store if vectorstore is not None else ChunkStore()
+        ids = store.append(documents)
+
+        # ---------------------------
+        # Dense Vector Index (FAISS)
+        # ---------------------------
+        if vectorstore is None and Config.INDEX_SHARDS > 1:
+            from retrieval.sharded import ShardedIndex
+
+            vectorstore = ShardedIndex(get_embedding_model(), dim=len(vectors[0]), store=store)
+        elif vectorstore is None:
+            vectorstore = DenseIndex(get_embedding_model(), dim=len(vectors[0]), store=store)
+        elif copy:
+            vectorstore = vectorstore.copy()
+
+        vectorstore.add(ids, vectors)
+
+        sharded = getattr(vectorstore, "keyword", None)
+        if sharded is not None:
+            # BM25 postings were added to the shards with the vectors
+            return vectorstore, sharded
+
+        # ---------------------------
+        # Keyword Index (BM25)
+        # IDF is recomputed lazily on next search
+        # ---------------------------
+        if bm25 is None:
+            bm25 = KeywordIndex(store=store)
+        elif copy:
+            bm25 = bm25.copy()
+
+        bm25.add(ids)
 
-    return vectorstore.as_retriever(
-        search_type="mmr",
-        search_kwargs={
-            "k": Config.RETRIEVAL_K,
-            "fetch_k": Config.FETCH_K,
-        },
-    )
+    return vectorstore, bm25
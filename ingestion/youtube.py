@@ -0,0 +1,400 @@
+"""
+YouTube transcript ingestion.
+
+- Accepts many video URLs / IDs and playlist URLs
+- Fetches transcripts concurrently under a shared rate limit
+- Caches transcripts on disk by video ID + language
+- Emits segment-aligned Documents with start / end timestamps
+
+The transcript source is pluggable (TranscriptProvider), so tests
+and offline runs can use a local stand-in instead of YouTube.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from config import Config
+from utils.logger import get_logger
+from utils.tracing import record_cache, span
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = get_logger(__name__)
+
+# One transcript line: {"text": str, "start": float, "duration": float}
+Segment = Dict[str, object]
+
+_VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+# ==========================================================
+# Transcript Providers
+# ==========================================================
+
+class TranscriptProvider(ABC):
+    """
+    Source of transcripts. fetch() returns (language_code, segments)
+    for the first available language in `languages`;
+    playlist_video_ids() lists a playlist's videos.
+    """
+
+    @abstractmethod
+    def fetch(self, video_id: str, languages: Sequence[str]) -> Tuple[str, List[Segment]]:
+        ...
+
+    def playlist_video_ids(self, list_id: str) -> List[str]:
+        raise NotImplementedError(f"{type(self).__name__} cannot expand playlists")
+
+
+class YouTubeTranscriptApiProvider(TranscriptProvider):
+    """
+    Live transcripts through youtube-transcript-api.
+    """
+
+    def __init__(self):
+        from youtube_transcript_api import YouTubeTranscriptApi
+
+        self._api = YouTubeTranscriptApi()
+
+    def fetch(self, video_id: str, languages: Sequence[str]) -> Tuple[str, List[Segment]]:
+        transcript = self._api.fetch(video_id, languages=list(languages))
+        return transcript.language_code, transcript.to_raw_data()
+
+    def playlist_video_ids(self, list_id: str) -> List[str]:
+        return expand_playlist(list_id)
+
+
+class LocalTranscriptProvider(TranscriptProvider):
+    """
+    In-memory stand-in: {video_id: {language: segments}}, plus
+    optional {playlist_id: [video_id, ...]}.
+    """
+
+    def __init__(
+        self,
+        transcripts: Dict[str, Dict[str, List[Segment]]],
+        playlists: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.transcripts = transcripts
+        self.playlists = playlists or {}
+        self.calls = 0
+
+    def fetch(self, video_id: str, languages: Sequence[str]) -> Tuple[str, List[Segment]]:
+        self.calls += 1
+        by_language = self.transcripts.get(video_id, {})
+
+        for language in languages:
+            if language in by_language:
+                return language, by_language[language]
+
+        raise LookupError(f"No transcript for {video_id} in {list(languages)}")
+
+    def playlist_video_ids(self, list_id: str) -> List[str]:
+        if list_id not in self.playlists:
+            raise LookupError(f"Unknown playlist {list_id}")
+        return list(self.playlists[list_id])
+
+
+# ==========================================================
+# Disk Cache
+# ==========================================================
+
+class TranscriptCache:
+    """
+    One JSON file per (video ID, language) under `directory`.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, video_id: str, language: str) -> str:
+        return os.path.join(self.directory, f"{video_id}.{language}.json")
+
+    def get(self, video_id: str, languages: Sequence[str]) -> Optional[Tuple[str, List[Segment]]]:
+        for language in languages:
+            path = self._path(video_id, language)
+            if os.path.exists(path):
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        return language, json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring unreadable transcript cache {path}: {e}")
+        return None
+
+    def put(self, video_id: str, language: str, segments: List[Segment]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(video_id, language)
+
+        # Write-then-rename so concurrent readers never see partial JSON
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(segments, f)
+        os.replace(tmp_path, path)
+
+
+# ==========================================================
+# Rate Limiter
+# ==========================================================
+
+class RateLimiter:
+    """
+    Spaces calls at least 1 / rate seconds apart across threads.
+    """
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self._interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# ==========================================================
+# URL Handling
+# ==========================================================
+
+def parse_video_id(url_or_id: str) -> str:
+    """
+    Video ID from a bare ID, youtu.be link, watch / shorts /
+    embed / live URL.
+    """
+    value = url_or_id.strip()
+
+    if _VIDEO_ID.match(value):
+        return value
+
+    parsed = urlparse(value)
+    host = parsed.netloc.lower()
+    path_parts = [p for p in parsed.path.split("/") if p]
+
+    if host.endswith("youtu.be") and path_parts:
+        candidate = path_parts[0]
+    elif "v" in parse_qs(parsed.query):
+        candidate = parse_qs(parsed.query)["v"][0]
+    elif len(path_parts) >= 2 and path_parts[0] in ("shorts", "embed", "live", "v"):
+        candidate = path_parts[1]
+    else:
+        candidate = ""
+
+    if not _VIDEO_ID.match(candidate):
+        raise ValueError(f'Could not determine the video ID for "{url_or_id}".')
+
+    return candidate
+
+
+def playlist_id(url: str) -> Optional[str]:
+    values = parse_qs(urlparse(url.strip()).query).get("list")
+    return values[0] if values else None
+
+
+def expand_playlist(list_id: str) -> List[str]:
+    """
+    Video IDs of a public playlist, in playlist order.
+
+    Best effort: there is no API for this, so the IDs are scraped
+    from the playlist page's embedded JSON, and only the first page
+    of results is seen. A page with no recognizable IDs (markup
+    change, consent page, private playlist) raises ValueError
+    instead of silently loading nothing.
+    """
+    import requests
+
+    response = requests.get(
+        "https://www.youtube.com/playlist",
+        params={"list": list_id},
+        headers={"Accept-Language": "en-US,en;q=0.9"},
+        timeout=Config.REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+
+    ids = re.findall(r'"videoId":"([A-Za-z0-9_-]{11})"', response.text)
+    if not ids:
+        raise ValueError(f"No videos found on the page of playlist {list_id}")
+
+    return list(dict.fromkeys(ids))[: Config.YOUTUBE_MAX_PLAYLIST_VIDEOS]
+
+
+def resolve_video_ids(urls_or_ids: Iterable[str], provider: TranscriptProvider) -> List[str]:
+    """
+    Flattens videos and playlists (expanded by `provider`) into
+    unique video IDs.
+    """
+    video_ids: List[str] = []
+
+    for item in urls_or_ids:
+        if not item.strip():
+            continue
+
+        list_id = playlist_id(item)
+        if list_id and "v=" not in item:
+            video_ids.extend(provider.playlist_video_ids(list_id))
+        else:
+            video_ids.append(parse_video_id(item))
+
+    return list(dict.fromkeys(video_ids))
+
+
+# ==========================================================
+# Segment-Aligned Documents
+# ==========================================================
+
+def segments_to_documents(
+    video_id: str,
+    language: str,
+    segments: List[Segment],
+    max_chars: Optional[int] = None,
+) -> List[Document]:
+    """
+    Groups consecutive transcript segments into Documents of at
+    most `max_chars`, never splitting a segment, with the time
+    span of each group in metadata (seconds).
+    """
+    from langchain_core.documents import Document
+
+    max_chars = max_chars or Config.CHUNK_SIZE
+    source = f"https://www.youtube.com/watch?v={video_id}"
+
+    documents = []
+    texts: List[str] = []
+    size = 0
+    start = end = 0.0
+
+    def flush():
+        documents.append(
+            Document(
+                page_content=" ".join(texts),
+                metadata={
+                    "source_type": "youtube",
+                    "source": source,
+                    "video_id": video_id,
+                    "language": language,
+                    "start": round(start, 2),
+                    "end": round(end, 2),
+                },
+            )
+        )
+
+    for segment in segments:
+        text = str(segment.get("text", "")).replace("\n", " ").strip()
+        if not text:
+            continue
+
+        seg_start = float(segment.get("start", 0.0))
+        seg_end = seg_start + float(segment.get("duration", 0.0))
+
+        if texts and size + len(text) + 1 > max_chars:
+            flush()
+            texts, size = [], 0
+
+        if not texts:
+            start = seg_start
+
+        texts.append(text)
+        size += len(text) + 1
+        end = seg_end
+
+    if texts:
+        flush()
+
+    return documents
+
+
+# ==========================================================
+# Loader
+# ==========================================================
+
+def load_youtube_videos(
+    urls_or_ids: Iterable[str],
+    languages: Optional[Sequence[str]] = None,
+    provider: Optional[TranscriptProvider] = None,
+    cache: Optional[TranscriptCache] = None,
+    max_workers: Optional[int] = None,
+    rate: Optional[float] = None,
+) -> List[Document]:
+    """
+    Loads transcripts for many videos / playlists concurrently.
+
+    Cached transcripts are served from disk without touching the
+    provider; only cache misses count against the rate limit.
+    Videos whose transcript cannot be fetched are skipped with a
+    warning; if none succeed, ValueError is raised.
+    """
+    languages = list(languages or Config.YOUTUBE_LANGUAGES)
+    cache = cache or TranscriptCache(Config.TRANSCRIPT_CACHE_DIR)
+    limiter = RateLimiter(rate or Config.YOUTUBE_REQUESTS_PER_SECOND)
+    urls_or_ids = [item for item in urls_or_ids if item.strip()]
+
+    if not urls_or_ids:
+        return []
+
+    if provider is None:
+        provider = YouTubeTranscriptApiProvider()
+
+    video_ids = resolve_video_ids(urls_or_ids, provider)
+    if not video_ids:
+        return []
+
+    def fetch(video_id: str) -> List[Document]:
+        cached = cache.get(video_id, languages)
+        record_cache("youtube_transcript", cached is not None)
+
+        if cached is not None:
+            language, segments = cached
+        else:
+            limiter.wait()
+            with span("load", source_type="youtube"):
+                language, segments = provider.fetch(video_id, languages)
+            cache.put(video_id, language, segments)
+
+        return segments_to_documents(video_id, language, segments)
+
+    documents: List[Document] = []
+    failures = 0
+
+    workers = min(max_workers or Config.YOUTUBE_MAX_WORKERS, len(video_ids))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="youtube") as pool:
+        # Each task runs in a copy of the caller's context, so its
+        # spans join the active trace (e.g. the ingestion job's)
+        futures = [
+            pool.submit(contextvars.copy_context().run, fetch, video_id)
+            for video_id in video_ids
+        ]
+
+        # Collect in input order
+        for video_id, future in zip(video_ids, futures):
+            try:
+                documents.extend(future.result())
+            except Exception as e:
+                failures += 1
+                logger.warning(f"YouTube transcript failed for {video_id}: {e}")
+
+    if failures == len(video_ids):
+        raise ValueError(
+            "Could not fetch YouTube transcript. "
+            "YouTube may be blocking cloud requests."
+        )
+
+    logger.info(
+        f"Loaded {len(documents)} transcript segments from "
+        f"{len(video_ids) - failures}/{len(video_ids)} videos"
+    )
+
+    return documents
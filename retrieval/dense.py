@@ -0,0 +1,452 @@
+"""
+Native dense retrieval engine.
+
+Keeps chunk vectors as one contiguous matrix of unit vectors
+(FAISS IndexFlatIP storage viewed as NumPy, or CompactVectorIndex
+for quantized storage) and runs MMR as batched matrix operations
+over a real fetch_k shortlist.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from ingestion.chunkstore import ChunkStore
+from ingestion.quantization import CompactVectorIndex, truncate_and_normalize
+from utils.locks import ReadWriteLock
+from utils.logger import get_logger
+from utils.tracing import record_cache
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = get_logger(__name__)
+
+# (chunk id, score) pairs, best first; ids index the ChunkStore
+Hits = List[Tuple[int, float]]
+
+# Vectors per block when moving a view onto its own storage
+_DETACH_BLOCK = 65536
+
+
+# ==========================================================
+# Vectorized MMR
+# ==========================================================
+
+def mmr_select(
+    query_vectors: np.ndarray,
+    candidate_vectors: np.ndarray,
+    valid: np.ndarray,
+    k: int,
+    lambda_mult: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Maximal marginal relevance for a batch of queries at once.
+
+    Args:
+        query_vectors: (n, d) unit query vectors
+        candidate_vectors: (n, m, d) unit shortlist vectors
+        valid: (n, m) mask of real candidates (shortlists can be short)
+        k: results per query
+
+    Returns:
+        (order, relevance): (n, k) candidate indices into the
+        shortlist (-1 when exhausted) and (n, m) query similarities.
+    """
+    n, m, _ = candidate_vectors.shape
+    k = min(k, m)
+
+    relevance = np.einsum("nmd,nd->nm", candidate_vectors, query_vectors)
+    redundancy = np.einsum("nmd,njd->nmj", candidate_vectors, candidate_vectors)
+
+    rows = np.arange(n)
+    available = valid.copy()
+    max_redundancy = np.full((n, m), -np.inf, dtype=np.float32)
+    order = np.full((n, k), -1, dtype=np.int64)
+
+    for step in range(k):
+        if step == 0:
+            score = relevance.copy()
+        else:
+            score = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+
+        score[~available] = -np.inf
+        pick = np.argmax(score, axis=1)
+        has_pick = available[rows, pick]
+
+        order[has_pick, step] = pick[has_pick]
+        available[rows, pick] = False
+        max_redundancy = np.maximum(max_redundancy, redundancy[rows, pick])
+
+    return order, relevance
+
+
+def mmr_hits(
+    query_vectors: np.ndarray,
+    candidate_ids: np.ndarray,
+    candidate_vectors: np.ndarray,
+    k: int,
+    lambda_mult: float,
+) -> List[Hits]:
+    """
+    MMR over a (n, m) shortlist of chunk ids (-1 = empty slot,
+    best first) with their (n, m, d) vectors.
+    """
+    order, relevance = mmr_select(
+        query_vectors, candidate_vectors, candidate_ids >= 0, k, lambda_mult
+    )
+
+    results = []
+    for row in range(len(query_vectors)):
+        picks = order[row][order[row] >= 0]
+        results.append(
+            [(int(candidate_ids[row, p]), float(relevance[row, p])) for p in picks]
+        )
+
+    return results
+
+
+def _top_by_score(scores: np.ndarray, positions: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    First k of each row by score descending, then position.
+    """
+    order = np.lexsort((positions, -scores))[:, :k]
+    return (
+        np.take_along_axis(scores, order, axis=1),
+        np.take_along_axis(positions, order, axis=1),
+    )
+
+
+# ==========================================================
+# Query Embedding (cached)
+# ==========================================================
+
+class QueryEmbedding:
+    """
+    Batched, LRU-cached query embedding shared by the dense index
+    types. Needs `embeddings`; call _init_query_cache() first.
+    """
+
+    def _init_query_cache(self) -> None:
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()  # sessions share one index
+
+    def embed_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """
+        Unit query vectors, embedded in one batched request.
+        Repeated queries (Streamlit reruns, follow-ups) reuse the
+        cached vector instead of re-embedding.
+        """
+        if not queries:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        with self._cache_lock:
+            found = {q: self._query_cache.get(q) for q in dict.fromkeys(queries)}
+        missing = [q for q, vector in found.items() if vector is None]
+
+        for q in queries:
+            record_cache("query_embedding", found[q] is not None)
+
+        if missing:
+            # Embedding call made outside the lock
+            if len(missing) == 1:
+                fresh = [self.embeddings.embed_query(missing[0])]
+            else:
+                fresh = self.embeddings.embed_documents(
+                    missing, task_type="RETRIEVAL_QUERY"
+                )
+            for q, vector in zip(missing, truncate_and_normalize(fresh, None)):
+                found[q] = vector
+
+        with self._cache_lock:
+            for q, vector in found.items():
+                self._query_cache[q] = vector
+                self._query_cache.move_to_end(q)
+            while len(self._query_cache) > Config.QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+
+        return np.stack([found[q] for q in queries])
+
+    def _copy_query_cache(self, clone) -> None:
+        with self._cache_lock:
+            clone._query_cache = OrderedDict(self._query_cache)
+        clone._cache_lock = threading.Lock()
+
+
+# ==========================================================
+# Dense Index
+# ==========================================================
+
+class DenseIndex(QueryEmbedding):
+    """
+    Chunk vectors searched with FAISS and re-ranked with
+    vectorized MMR. Chunk texts and metadata live in the shared
+    ChunkStore; `ids` maps FAISS positions to chunk ids.
+
+    copy() returns a view on the same FAISS storage. A view only
+    searches the first len(ids) vectors, so extending a copy
+    leaves the original answering over the vectors it had
+    (copy-on-write updates through IndexHandle) without copying
+    the corpus.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        dim: int,
+        storage: Optional[str] = None,
+        store: Optional[ChunkStore] = None,
+    ):
+        self.embeddings = embeddings
+        self.storage = storage or Config.EMBEDDING_STORAGE
+        self.store = store if store is not None else ChunkStore()
+        self.ids = np.empty(0, dtype=np.int64)  # ascending (store order)
+        self.index = self._new_index(dim)
+        self._lock = ReadWriteLock()  # shared by views of self.index
+        self._init_query_cache()
+
+    def _new_index(self, dim: int):
+        import faiss
+
+        if self.storage == "float32":
+            return faiss.IndexFlatIP(dim)
+        return CompactVectorIndex(
+            dim,
+            storage=self.storage,
+            rescore_factor=Config.RESCORE_FACTOR,
+            directory=Config.VECTOR_CACHE_DIR,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.index.d
+
+    # ------------------------------
+    # Storage
+    # ------------------------------
+    def add(self, ids: Sequence[int], vectors) -> None:
+        """
+        Adds vectors for chunks already in the store.
+        """
+        vectors = truncate_and_normalize(vectors, None)
+
+        if len(vectors) != len(ids):
+            raise ValueError("ids and vectors must have the same length")
+
+        with self._lock.write():
+            latest = self.index.ntotal == len(self)
+            if latest:
+                self.index.add(vectors)
+
+        if not latest:
+            # Another view has already appended past this one
+            self._detach()
+            self.index.add(vectors)
+
+        # New array (not in-place): the length bounds other views
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+
+    def copy(self) -> "DenseIndex":
+        """
+        View for copy-on-write updates: readers keep searching
+        the original while the copy is extended. O(1); the FAISS
+        storage and chunk store are shared (both append-only).
+        """
+        clone = DenseIndex.__new__(DenseIndex)
+        clone.__dict__.update(self.__dict__)
+        self._copy_query_cache(clone)
+        return clone
+
+    def _detach(self) -> None:
+        """
+        Moves this view onto storage of its own, holding its
+        vectors only (a stale view being extended).
+        """
+        index = self._new_index(self.dim)
+        for start in range(0, len(self), _DETACH_BLOCK):
+            index.add(self.vectors(np.arange(start, min(start + _DETACH_BLOCK, len(self)))))
+
+        logger.info(f"Detached dense index view ({len(self)} vectors)")
+        self.index = index
+        self._lock = ReadWriteLock()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        Zero-copy (len, dim) view of the float32 FAISS storage.
+        Only valid until the next add to any view (FAISS may
+        reallocate); hold self._lock.read() while using it.
+        """
+        import faiss
+
+        if self.storage != "float32":
+            raise AttributeError("matrix is only available for float32 storage")
+
+        n, d = len(self), self.index.d
+        if n == 0:
+            return np.empty((0, d), dtype=np.float32)
+        return faiss.rev_swig_ptr(self.index.get_xb(), n * d).reshape(n, d)
+
+    def vectors(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Full-precision unit vectors for the given positions.
+        """
+        with self._lock.read():
+            if self.storage == "float32":
+                return self.matrix[ids]
+            return self.index.full.get(ids.ravel()).reshape(*ids.shape, self.dim)
+
+    # ------------------------------
+    # Search
+    # ------------------------------
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        k: int = None,
+        fetch_k: int = None,
+        lambda_mult: float = None,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[Hits]:
+        """
+        Batched MMR search. Returns, per query, up to k
+        (chunk id, similarity) pairs in MMR order.
+
+        `allowed` (boolean mask over chunk ids, see
+        ChunkStore.select) restricts the search before ranking:
+        small scopes are scored exactly on the gathered vectors,
+        larger ones through a FAISS bitmap ID selector.
+        """
+        k = k or Config.FETCH_K
+        lambda_mult = Config.MMR_LAMBDA if lambda_mult is None else lambda_mult
+
+        scope = None
+        if allowed is not None:
+            scope = np.flatnonzero(allowed[self.ids])
+        size = len(self) if scope is None else len(scope)
+
+        fetch_k = min(max(fetch_k or Config.MMR_FETCH_K, k), size)
+        query_vectors = truncate_and_normalize(query_vectors, None)
+
+        if fetch_k == 0:
+            return [[] for _ in range(len(query_vectors))]
+
+        # Bound the (queries, fetch_k, dim) candidate tensor
+        step = Config.DENSE_QUERY_BATCH
+        results: List[Hits] = []
+        for start in range(0, len(query_vectors), step):
+            results.extend(
+                self._search_block(
+                    query_vectors[start : start + step], k, fetch_k, lambda_mult, scope
+                )
+            )
+
+        return results
+
+    def vectors_for_ids(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """
+        Full-precision unit vectors for indexed chunk ids.
+        """
+        return self.vectors(np.searchsorted(self.ids, chunk_ids))
+
+    def candidates(
+        self,
+        query_vectors: np.ndarray,
+        fetch_k: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (scores, chunk ids) of the top fetch_k chunks per query,
+        best first, -1 padded; the shortlist step of search(),
+        used by shards in scatter-gather search. Query vectors
+        must already be unit length (as search() leaves them).
+        """
+        scope = None if allowed is None else np.flatnonzero(allowed[self.ids])
+        size = len(self) if scope is None else len(scope)
+
+        fetch_k = min(fetch_k, size)
+        if fetch_k == 0:
+            empty = np.empty((len(query_vectors), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+
+        scores, shortlist = self._shortlist(query_vectors, fetch_k, scope)
+        valid = shortlist >= 0
+        return scores, np.where(valid, self.ids[np.where(valid, shortlist, 0)], -1)
+
+    def _shortlist(
+        self,
+        query_vectors: np.ndarray,
+        fetch_k: int,
+        scope: Optional[np.ndarray],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (n, fetch_k) scores and FAISS positions, optionally within
+        `scope` (sorted positions), -1 padded. Equal scores are
+        ordered by position (= chunk id order), also across the
+        fetch_k cut, so duplicates rank the same in every shard.
+        """
+        import faiss
+
+        if scope is not None and len(scope) <= Config.FILTER_GATHER_MAX:
+            scores = query_vectors @ self.vectors(scope).T
+            return _top_by_score(scores, np.broadcast_to(scope, scores.shape), fetch_k)
+
+        params = None
+        size = len(self)
+        if scope is not None:
+            mask = np.zeros(len(self), dtype=bool)
+            mask[scope] = True
+            bits = np.packbits(mask, bitorder="little")  # must outlive the search
+            params = faiss.SearchParameters(
+                sel=faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits))
+            )
+            size = len(scope)
+
+        # One result past fetch_k shows whether a tie spans the cut;
+        # widen until every tied candidate is in
+        wanted = min(fetch_k + 1, size)
+        with self._lock.read():
+            if params is None and self.index.ntotal > size:
+                # Vectors appended by newer views are not in this one
+                params = faiss.SearchParameters(sel=faiss.IDSelectorRange(0, size))
+
+            while True:
+                scores, positions = self.index.search(query_vectors, wanted, params=params)
+                if wanted == size or not np.any(scores[:, fetch_k - 1] == scores[:, -1]):
+                    break
+                wanted = min(2 * wanted, size)
+
+        return _top_by_score(scores, positions, fetch_k)
+
+    def _search_block(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        fetch_k: int,
+        lambda_mult: float,
+        scope: Optional[np.ndarray] = None,
+    ) -> List[Hits]:
+        # Shortlist (exact or rescored scores)
+        _, shortlist = self._shortlist(query_vectors, fetch_k, scope)
+        valid = shortlist >= 0
+        positions = np.where(valid, shortlist, 0)
+
+        return mmr_hits(
+            query_vectors,
+            np.where(valid, self.ids[positions], -1),
+            self.vectors(positions),
+            k,
+            lambda_mult,
+        )
+
+    def search_documents(self, query: str, k: int = None) -> List[Document]:
+        hits = self.search(self.embed_queries([query]), k=k)[0]
+        return self.store.documents(chunk_id for chunk_id, _ in hits)
+
@@ -1,12 +1,17 @@
-from typing import List, Tuple
-from collections import defaultdict
+from __future__ import annotations
 
-from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-from langchain_community.retrievers import BM25Retriever
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from collections import defaultdict
 
 from config import Config
 from utils.logger import get_logger
+from utils.tracing import span
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from ingestion.chunkstore import Filters
+    from retrieval.dense import DenseIndex, Hits
+    from retrieval.keyword import KeywordIndex
 
 logger = get_logger(__name__)
 
@@ -17,66 +22,119 @@ logger = get_logger(__name__)
 
 def hybrid_retrieve(
     query: str,
-    vectorstore: FAISS,
-    bm25: BM25Retriever,
+    vectorstore: DenseIndex,
+    bm25: KeywordIndex,
+    k: Optional[int] = None,
+    filters: Optional[Filters] = None,
 ) -> List[Tuple[Document, float]]:
     """
     Performs hybrid retrieval using:
-    - Dense FAISS (MMR)
-    - BM25 keyword retrieval
+    - Dense FAISS + vectorized MMR (retrieval.dense)
+    - BM25 keyword retrieval (retrieval.keyword)
+
+    filters, e.g. {"source_type": "pdf", "source": ["a.pdf"]},
+    restrict both legs to matching chunks before ranking.
 
     Returns:
-        List of (Document, combined_score)
+        List of (Document, combined_score); only the top k
+        (default: all fused) are materialized from the store.
+    """
+
+    return hybrid_retrieve_batch([query], vectorstore, bm25, k, filters)[0]
+
+
+def hybrid_retrieve_batch(
+    queries: List[str],
+    vectorstore: DenseIndex,
+    bm25: KeywordIndex,
+    k: Optional[int] = None,
+    filters: Optional[Filters] = None,
+) -> List[List[Tuple[Document, float]]]:
+    """
+    Hybrid retrieval for many queries at once: one embedding
+    request, one multi-query FAISS search + MMR pass and one
+    vectorized BM25 pass. Results are in query order.
     """
 
-    logger.info("Starting hybrid retrieval")
+    logger.info(f"Starting hybrid retrieval for {len(queries)} queries")
+
+    if not queries:
+        return []
 
     # ---------------------------
-    # Dense Retrieval (MMR)
+    # Metadata Pre-Filter (bitmaps)
     # ---------------------------
-    dense_retriever = vectorstore.as_retriever(
-        search_type="mmr",
-        search_kwargs={
-            "k": Config.FETCH_K,
-            "fetch_k": Config.FETCH_K,
-        },
-    )
+    allowed = None
+    if filters:
+        with span("filter", fields=len(filters)) as stage:
+            allowed = vectorstore.store.select(filters)
+            stage["selected"] = None if allowed is None else int(allowed.sum())
+
+        if allowed is not None and not allowed.any():
+            logger.info(f"No chunks match filters {filters}")
+            return [[] for _ in queries]
 
-    dense_docs = dense_retriever.invoke(query)
+    # ---------------------------
+    # Dense Retrieval (MMR)
+    # ---------------------------
+    with span("dense_search", queries=len(queries)) as stage:
+        query_vectors = vectorstore.embed_queries(queries)
+        dense_hits = vectorstore.search(query_vectors, k=Config.FETCH_K, allowed=allowed)
+        stage["results"] = sum(len(h) for h in dense_hits)
 
     # ---------------------------
     # BM25 Retrieval
     # ---------------------------
-    bm25_docs = bm25.invoke(query)
+    with span("bm25_search", queries=len(queries)) as stage:
+        bm25_hits = bm25.search(queries, k=Config.FETCH_K, allowed=allowed)
+        stage["results"] = sum(len(h) for h in bm25_hits)
 
     # ---------------------------
     # Score Fusion (Rank-Based)
     # ---------------------------
+    with span("fusion"):
+        fused = [
+            fuse_rankings(dense, keyword)[:k]
+            for dense, keyword in zip(dense_hits, bm25_hits)
+        ]
+
+    # Documents only for the returned chunks
+    store = vectorstore.store
+    results = [
+        [(store.document(chunk_id), score) for chunk_id, score in hits]
+        for hits in fused
+    ]
+
+    logger.info(
+        f"Hybrid retrieval returned {sum(len(r) for r in results)} results"
+    )
+
+    return results
+
+
+def fuse_rankings(
+    dense_hits: Hits,
+    bm25_hits: Hits,
+) -> Hits:
+    """
+    Weighted reciprocal-rank fusion on shared chunk ids.
+    """
+
     scores = defaultdict(float)
-    doc_lookup = {}
 
     # Dense scoring
-    for rank, doc in enumerate(dense_docs):
-        key = (doc.page_content, tuple(doc.metadata.items()))
-        doc_lookup[key] = doc
-        scores[key] += Config.DENSE_WEIGHT * (1 / (rank + 1))
+    for rank, (chunk_id, _) in enumerate(dense_hits):
+        scores[chunk_id] += Config.DENSE_WEIGHT * (1 / (rank + 1))
 
     # BM25 scoring
-    for rank, doc in enumerate(bm25_docs):
-        key = (doc.page_content, tuple(doc.metadata.items()))
-        doc_lookup[key] = doc
-        scores[key] += Config.BM25_WEIGHT * (1 / (rank + 1))
+    for rank, (chunk_id, _) in enumerate(bm25_hits):
+        scores[chunk_id] += Config.BM25_WEIGHT * (1 / (rank + 1))
 
     # Combine and sort
-    combined = [
-        (doc_lookup[key], score)
-        for key, score in scores.items()
-    ]
+    combined = list(scores.items())
 
     combined.sort(key=lambda x: x[1], reverse=True)
 
-    logger.info(f"Hybrid retrieval returned {len(combined)} results")
-
     return combined
 
 
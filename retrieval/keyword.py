@@ -0,0 +1,377 @@
+"""
+Vectorized BM25 keyword index.
+
+Same scoring as rank_bm25.BM25Okapi (the engine behind LangChain's
+BM25Retriever), but stored as CSR postings with precomputed
+per-posting impacts, so a whole batch of queries is scored with a
+few NumPy scatter-adds and new chunks are appended incrementally
+instead of rebuilding the index.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from config import Config
+from ingestion.chunkstore import ChunkStore
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from retrieval.dense import Hits
+
+logger = get_logger(__name__)
+
+# A scoped search looks up in-scope chunks in a term's postings
+# (binary search) when the postings are this many times longer
+# than the scope; otherwise it scans them
+_SCOPE_PROBE_RATIO = 32
+
+
+def default_tokenize(text: str) -> List[str]:
+    """
+    Whitespace tokenizer (LangChain BM25Retriever default).
+    """
+    return text.split()
+
+
+class CorpusStats(NamedTuple):
+    """
+    Corpus-wide BM25 statistics supplied by the caller (sharded
+    search): IDF per query term and the average chunk length.
+    """
+
+    idf: Dict[str, float]
+    avgdl: float
+
+
+def bm25_idf(df: np.ndarray, n_docs: int, epsilon: float) -> np.ndarray:
+    """
+    BM25Okapi IDF per term; negative values are floored to
+    epsilon * mean IDF. The mean uses math.fsum, so it does not
+    depend on vocabulary order (shards and the unsharded index
+    agree exactly).
+    """
+    df = np.asarray(df, dtype=np.float64)
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    if len(idf):
+        floor = epsilon * (math.fsum(idf) / len(idf))
+        idf[idf < 0] = floor
+    return idf
+
+
+# ==========================================================
+# Keyword Index
+# ==========================================================
+
+class KeywordIndex:
+    """
+    Append-only BM25 index over chunks in a ChunkStore. Hits are
+    chunk ids, shared with the DenseIndex on the same store.
+
+    copy() returns a view on the same postings, bounded to its
+    first len(ids) chunks and the terms they contain, so extending
+    a copy leaves the original's scores unchanged.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        tokenize: Callable[[str], List[str]] = default_tokenize,
+        store: Optional[ChunkStore] = None,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.tokenize = tokenize
+
+        self.store = store if store is not None else ChunkStore()
+        self.ids = np.empty(0, dtype=np.int64)  # position -> chunk id
+        self._vocab: Dict[str, int] = {}
+        self._postings: List[List[int]] = []  # term -> [doc, tf, doc, tf, ...]
+        self._doc_len: List[int] = []
+        self._terms = 0  # vocabulary size of this view
+        self._total_len = 0
+        self._saturation = None  # (avgdl, indptr, docs, saturated tf)
+        self._compiled = None
+        self._write_lock = threading.Lock()  # shared by views
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def total_length(self) -> int:
+        return self._total_len
+
+    @property
+    def avgdl(self) -> float:
+        return self._total_len / len(self) if len(self) else 0.0
+
+    # ------------------------------
+    # Indexing
+    # ------------------------------
+    def add(self, ids: Sequence[int], texts: Optional[Sequence[str]] = None) -> Dict[str, int]:
+        """
+        Indexes chunks already in the store (or the given texts,
+        labelled with `ids`). Returns the number of added chunks
+        containing each term.
+        """
+        if texts is None:
+            texts = self.store.texts(ids)
+
+        added: Counter = Counter()
+
+        with self._write_lock:
+            if len(self._doc_len) != len(self):
+                # Another view has already appended past this one
+                self._detach()
+
+            for text in texts:
+                position = len(self._doc_len)
+                tokens = self.tokenize(text)
+                self._doc_len.append(len(tokens))
+                self._total_len += len(tokens)
+
+                counts = Counter(tokens)
+                added.update(counts.keys())
+
+                for term, tf in counts.items():
+                    term_id = self._vocab.get(term)
+                    if term_id is None:
+                        term_id = self._vocab[term] = len(self._postings)
+                        self._postings.append([])
+                    self._postings[term_id].extend((position, tf))
+
+            self._terms = len(self._postings)
+
+        # New array (not in-place): the length bounds other views
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self._saturation = self._compiled = None  # IDF / avgdl changed
+
+        return dict(added)
+
+    def copy(self) -> "KeywordIndex":
+        """
+        View for copy-on-write updates (see class docstring). O(1);
+        postings are shared until one of the views falls behind
+        and is extended.
+        """
+        clone = KeywordIndex.__new__(KeywordIndex)
+        clone.__dict__.update(self.__dict__)
+        return clone
+
+    def _detach(self) -> None:
+        """
+        Moves this view onto postings of its own, holding its
+        chunks only (a stale view being extended). Called with
+        the shared write lock held.
+        """
+        n = len(self)
+        self._postings = [_visible(p, n) for p in self._postings[: self._terms]]
+        self._vocab = {t: i for t, i in self._vocab.items() if i < self._terms}
+        self._doc_len = self._doc_len[:n]
+        self._write_lock = threading.Lock()
+
+        logger.info(f"Detached keyword index view ({n} chunks)")
+
+    def _saturated(self, avgdl: float):
+        """
+        CSR postings with the BM25 saturated tf of each posting
+        for the given average chunk length.
+        """
+        cached = self._saturation
+        if cached is not None and cached[0] == avgdl:
+            return cached[1:]
+
+        n = len(self)
+        postings = [_visible(p, n) for p in self._postings[: self._terms]]
+
+        lengths = np.fromiter(
+            (len(p) // 2 for p in postings), dtype=np.int64, count=len(postings)
+        )
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        flat = np.fromiter(
+            (v for p in postings for v in p), dtype=np.int64, count=2 * int(indptr[-1])
+        )
+        docs = flat[0::2]
+        tf = flat[1::2].astype(np.float32)
+
+        doc_len = np.asarray(self._doc_len[:n], dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_len[docs] / avgdl) if avgdl else self.k1
+        saturated = tf * (self.k1 + 1) / (tf + norm)
+
+        self._saturation = (avgdl, indptr, docs, saturated)
+        return indptr, docs, saturated
+
+    def _compile(self):
+        """
+        CSR postings with impact = idf * saturated tf, matching
+        BM25Okapi (negative idf floored to epsilon * mean idf).
+        """
+        if self._compiled is not None:
+            return self._compiled
+
+        indptr, docs, saturated = self._saturated(self.avgdl)
+        lengths = np.diff(indptr)
+
+        idf = bm25_idf(lengths, len(self), self.epsilon)
+        impact = (np.repeat(idf, lengths) * saturated).astype(np.float32)
+
+        self._compiled = (indptr, docs, impact)
+        return self._compiled
+
+    # ------------------------------
+    # Search
+    # ------------------------------
+    def search(
+        self,
+        queries: Sequence[str],
+        k: int = None,
+        allowed: Optional[np.ndarray] = None,
+        corpus: Optional[CorpusStats] = None,
+    ) -> List[Hits]:
+        """
+        Top-k (chunk id, score) per query, scored in one pass
+        over the postings of all query terms in the batch.
+        As with BM25Okapi, the k best chunks are returned even if
+        they score 0 or below (on 1-2 chunk corpora every floored
+        IDF is negative); equal scores are ordered by chunk id.
+
+        `allowed` (boolean mask over chunk ids) restricts scoring to
+        those chunks (a small scope is looked up in long posting
+        lists instead of scanning them); IDF and average length
+        stay corpus-wide, so scores equal the unfiltered ones. `corpus` replaces this
+        index's own statistics (a shard scoring against the
+        whole corpus).
+        """
+        k = k or Config.FETCH_K
+        results: List[Hits] = []
+
+        scope = column = None
+        if allowed is not None:
+            scope = np.flatnonzero(allowed[self.ids])
+            # position -> score column, -1 outside the scope
+            column = np.full(len(self), -1, dtype=np.int64)
+            column[scope] = np.arange(len(scope))
+
+        if not len(self) or (scope is not None and not len(scope)):
+            return [[] for _ in queries]
+
+        step = Config.KEYWORD_QUERY_BATCH
+        for start in range(0, len(queries), step):
+            results.extend(
+                self._search_block(queries[start : start + step], k, scope, column, corpus)
+            )
+
+        return results
+
+    def _search_block(
+        self,
+        queries: Sequence[str],
+        k: int,
+        scope: Optional[np.ndarray] = None,
+        column: Optional[np.ndarray] = None,
+        corpus: Optional[CorpusStats] = None,
+    ) -> List[Hits]:
+        if corpus is None:
+            indptr, docs, impact = self._compile()
+        else:
+            indptr, docs, saturated = self._saturated(corpus.avgdl)
+
+        width = len(self) if scope is None else len(scope)
+        scores = np.zeros((len(queries), width), dtype=np.float32)
+
+        # term id -> (query rows, term counts); repeated query terms
+        # count multiple times, as in BM25Okapi.get_scores
+        by_term: Dict[int, Dict[int, int]] = {}
+        terms: Dict[int, str] = {}
+        for row, query in enumerate(queries):
+            for term in self.tokenize(query):
+                term_id = self._vocab.get(term)
+                if term_id is not None and term_id < self._terms:
+                    rows = by_term.setdefault(term_id, {})
+                    rows[row] = rows.get(row, 0) + 1
+                    terms[term_id] = term
+
+        for term_id, rows in by_term.items():
+            lo, hi = indptr[term_id], indptr[term_id + 1]
+
+            # Postings to score (indices into docs) and their columns
+            if scope is None:
+                selected, targets = slice(lo, hi), docs[lo:hi]
+            elif len(scope) * _SCOPE_PROBE_RATIO < hi - lo:
+                # Small scope: look each in-scope chunk up in the
+                # (position-sorted) postings instead of scanning them
+                found = lo + np.searchsorted(docs[lo:hi], scope)
+                inside = found < hi
+                inside[inside] = docs[found[inside]] == scope[inside]
+                selected, targets = found[inside], np.flatnonzero(inside)
+            else:
+                targets = column[docs[lo:hi]]
+                inside = targets >= 0
+                selected, targets = lo + np.flatnonzero(inside), targets[inside]
+
+            if not len(targets):
+                continue
+
+            if corpus is None:
+                impacts = impact[selected]
+            else:
+                # Same float64 product as _compile, so scores match
+                idf = corpus.idf.get(terms[term_id], 0.0)
+                impacts = (saturated[selected].astype(np.float64) * idf).astype(np.float32)
+
+            row_ids = np.fromiter(rows.keys(), dtype=np.int64, count=len(rows))
+            counts = np.fromiter(rows.values(), dtype=np.float32, count=len(rows))
+            scores[np.ix_(row_ids, targets)] += counts[:, None] * impacts
+
+        chunk_ids = self.ids if scope is None else self.ids[scope]
+
+        return [
+            [(int(chunk_ids[col]), score) for col, score in _top_k(row_scores, k)]
+            for row_scores in scores
+        ]
+
+    def search_documents(self, query: str, k: int = None) -> List[Document]:
+        hits = self.search([query], k)[0]
+        return self.store.documents(chunk_id for chunk_id, _ in hits)
+
+
+def _visible(postings: List[int], n: int) -> List[int]:
+    """
+    Snapshot of a [doc, tf, ...] posting list (docs ascending)
+    without the postings of docs n and later.
+    """
+    postings = postings[:]  # a newer view may be appending
+    if postings and postings[-2] >= n:
+        postings = postings[: 2 * bisect_left(postings[0::2], n)]
+    return postings
+
+
+def _top_k(scores: np.ndarray, k: int) -> Hits:
+    """
+    Top-k scores as in BM25Okapi.get_top_n: chunks scoring 0 or
+    below are included when fewer than k score higher. Ties are
+    broken by lower position.
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return []
+
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+
+    above = np.flatnonzero(scores > kth)
+    above = above[np.lexsort((above, -scores[above]))]
+    tied = np.flatnonzero(scores == kth)[: k - len(above)]
+
+    return [(int(i), float(scores[i])) for i in np.concatenate([above, tied])]
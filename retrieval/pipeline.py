@@ -1,12 +1,18 @@
-from typing import List, Dict
+from __future__ import annotations
 
-from langchain_core.documents import Document
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 
 from config import Config
 from utils.logger import get_logger
-from retrieval.hybrid import hybrid_retrieve, select_top_documents
+from utils.tracing import record_tokens, span, start_trace
+from retrieval.hybrid import (
+    hybrid_retrieve,
+    hybrid_retrieve_batch,
+    select_top_documents,
+)
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 
 logger = get_logger(__name__)
 
@@ -21,16 +27,38 @@ def get_llm():
     global _llm_instance
 
     if _llm_instance is None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         _llm_instance = ChatGoogleGenerativeAI(
             model=Config.LLM_MODEL,
             temperature=Config.LLM_TEMPERATURE,
-            google_api_key=Config.GOOGLE_API_KEY,
+            google_api_key=Config.require_api_key(),
             max_output_tokens=Config.LLM_MAX_TOKENS,
         )
 
     return _llm_instance
 
 
+# ==========================================================
+# Prompt
+# ==========================================================
+
+NO_CONTEXT_ANSWER = "No relevant context found."
+
+SYSTEM_PROMPT = (
+    "You are a helpful and knowledgeable assistant.\n"
+    "Use the provided context to answer the user's question.\n"
+    "Base your answer primarily on the context.\n"
+    "You may expand or clarify logically for better understanding.\n"
+    "Do not introduce unrelated or unsupported information.\n"
+    "If the context is insufficient, respond exactly with:\n"
+    "'No relevant context found.'\n"
+    "If the question requests detailed explanation (e.g., 5 or 10 marks), "
+    "provide a well-structured and sufficiently detailed answer.\n"
+    "Use conversation history to resolve follow-up references like 'it' or 'that'."
+)
+
+
 # ==========================================================
 # Context Builder
 # ==========================================================
@@ -39,6 +67,61 @@ def build_context(docs: List[Document]) -> str:
     return "\n\n".join([doc.page_content for doc in docs])
 
 
+def build_messages(
+    query: str,
+    docs: List[Document],
+    chat_history: Optional[List[Dict[str, str]]],
+) -> list:
+    """
+    System + user messages: short-term memory, context, question.
+    """
+    from langchain_core.messages import SystemMessage, HumanMessage
+
+    context_text = build_context(docs)
+
+    # Short-Term Memory
+    memory_block = ""
+
+    if chat_history:
+        recent_history = chat_history[-Config.MAX_CHAT_HISTORY :]
+        memory_lines = []
+
+        for turn in recent_history:
+            role = turn["role"]
+            content = turn["content"]
+            memory_lines.append(f"{role.upper()}: {content}")
+
+        memory_block = "\n".join(memory_lines)
+
+    user_prompt = (
+        f"Conversation History:\n{memory_block}\n\n"
+        f"Context:\n{context_text}\n\n"
+        f"Question:\n{query}"
+    )
+
+    return [
+        SystemMessage(content=SYSTEM_PROMPT),
+        HumanMessage(content=user_prompt),
+    ]
+
+
+def format_sources(docs: List[Document]) -> List[Dict]:
+    return [
+        {
+            "source": doc.metadata.get("source"),
+            "type": doc.metadata.get("source_type"),
+            "page": doc.metadata.get("page"),
+            "start": doc.metadata.get("start"),  # YouTube segment (seconds)
+        }
+        for doc in docs
+    ]
+
+
+def _usage(response) -> Tuple[int, int]:
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+
 # ==========================================================
 # Main RAG Pipeline (Interactive)
 # ==========================================================
@@ -48,93 +131,192 @@ def run_rag_pipeline(
     vectorstore,
     bm25,
     chat_history: List[Dict[str, str]],
+    filters: Optional[Dict] = None,
 ):
     """
     Interactive unified RAG pipeline.
+
+    The result carries a per-request "trace" with the timing
+    of every stage (retrieval legs, prompt build, LLM call).
+    `filters` scopes retrieval by chunk metadata
+    (see hybrid_retrieve).
     """
 
     logger.info("Running RAG pipeline")
 
+    with start_trace("rag_pipeline") as trace:
+        result = _answer_query(query, vectorstore, bm25, chat_history, filters)
+
+    result["trace"] = trace.to_dict()
+
+    return result
+
+
+def _answer_query(
+    query: str,
+    vectorstore,
+    bm25,
+    chat_history: List[Dict[str, str]],
+    filters: Optional[Dict] = None,
+):
     # ---------------------------------------
     # Step 1: Hybrid Retrieval
     # ---------------------------------------
-    results = hybrid_retrieve(query, vectorstore, bm25)
+    results = hybrid_retrieve(
+        query, vectorstore, bm25, k=Config.RETRIEVAL_K, filters=filters
+    )
     selected_docs = select_top_documents(results)
 
     if not selected_docs:
         return {
-            "answer": "No relevant context found.",
+            "answer": NO_CONTEXT_ANSWER,
             "sources": [],
         }
 
     # ---------------------------------------
-    # Step 2: Build Context
+    # Step 2: Context + Short-Term Memory
     # ---------------------------------------
-    context_text = build_context(selected_docs)
+    with span("prompt_build", documents=len(selected_docs)) as stage:
+        messages = build_messages(query, selected_docs, chat_history)
+        stage["prompt_chars"] = len(messages[1].content)
 
     # ---------------------------------------
-    # Step 3: Add Short-Term Memory
+    # Step 3: LLM Grounded Generation
     # ---------------------------------------
-    memory_block = ""
+    llm = get_llm()
 
-    if chat_history:
-        recent_history = chat_history[-Config.MAX_CHAT_HISTORY :]
-        memory_lines = []
+    with span("llm_call", model=Config.LLM_MODEL) as stage:
+        response = llm.invoke(messages)
 
-        for turn in recent_history:
-            role = turn["role"]
-            content = turn["content"]
-            memory_lines.append(f"{role.upper()}: {content}")
+        stage["input_tokens"], stage["output_tokens"] = _usage(response)
+        record_tokens(
+            Config.LLM_MODEL,
+            stage["input_tokens"],
+            stage["output_tokens"],
+        )
 
-        memory_block = "\n".join(memory_lines)
+    answer = response.content.strip()
 
     # ---------------------------------------
-    # Step 4: LLM Grounded Generation
+    # Step 4: Source Formatting
     # ---------------------------------------
-    llm = get_llm()
+    return {
+        "answer": answer,
+        "sources": format_sources(selected_docs),
+    }
 
-    system_prompt = (
-    "You are a helpful and knowledgeable assistant.\n",
-    "Use the provided context to answer the user's question.\n",
-    "Base your answer primarily on the context.\n",
-    "You may expand or clarify logically for better understanding.\n",
-    "Do not introduce unrelated or unsupported information.\n",
-    "If the context is insufficient, respond exactly with:\n",
-    "'No relevant context found.'\n",
-    "If the question requests detailed explanation (e.g., 5 or 10 marks), "
-    "provide a well-structured and sufficiently detailed answer.\n",
-    "Use conversation history to resolve follow-up references like 'it' or 'that'."
-)
 
+# ==========================================================
+# Batch RAG Pipeline (Evaluation / Bulk FAQ)
+# ==========================================================
 
-    user_prompt = (
-        f"Conversation History:\n{memory_block}\n\n"
-        f"Context:\n{context_text}\n\n"
-        f"Question:\n{query}"
-    )
+def run_rag_pipeline_batch(
+    queries: List[str],
+    vectorstore,
+    bm25,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    max_concurrency: Optional[int] = None,
+    filters: Optional[Dict] = None,
+) -> List[Dict]:
+    """
+    Answers many independent questions in one pass.
+
+    - One embedding request for all queries
+    - One multi-query FAISS + MMR search, one BM25 pass
+    - LLM calls fanned out with bounded concurrency
+
+    Results are returned in query order. A failed LLM call sets
+    "answer" to None and "error" to the message, without failing
+    the rest of the batch.
+    """
+
+    logger.info(f"Running batch RAG pipeline for {len(queries)} queries")
 
-    response = llm.invoke(
-        [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt),
-        ]
+    if not queries:
+        return []
+
+    with start_trace("rag_pipeline_batch") as trace:
+        results = _answer_batch(
+            queries,
+            vectorstore,
+            bm25,
+            chat_history,
+            max_concurrency or Config.BATCH_MAX_CONCURRENCY,
+            filters,
+        )
+
+    trace_dict = trace.to_dict()
+    for result in results:
+        result["trace"] = trace_dict
+
+    return results
+
+
+def _answer_batch(
+    queries: List[str],
+    vectorstore,
+    bm25,
+    chat_history: Optional[List[Dict[str, str]]],
+    max_concurrency: int,
+    filters: Optional[Dict] = None,
+) -> List[Dict]:
+    retrieved = hybrid_retrieve_batch(
+        queries, vectorstore, bm25, k=Config.RETRIEVAL_K, filters=filters
     )
 
-    answer = response.content.strip()
+    results: List[Optional[Dict]] = [None] * len(queries)
+    pending = []  # (position, messages, selected_docs)
 
-    # ---------------------------------------
-    # Step 5: Source Formatting
-    # ---------------------------------------
-    sources = [
-        {
-            "source": doc.metadata.get("source"),
-            "type": doc.metadata.get("source_type"),
-            "page": doc.metadata.get("page"),
-        }
-        for doc in selected_docs
-    ]
+    with span("prompt_build", queries=len(queries)):
+        for position, (query, hits) in enumerate(zip(queries, retrieved)):
+            selected_docs = select_top_documents(hits)
 
-    return {
-        "answer": answer,
-        "sources": sources,
-    }
+            if not selected_docs:
+                results[position] = {"answer": NO_CONTEXT_ANSWER, "sources": []}
+            else:
+                messages = build_messages(query, selected_docs, chat_history)
+                pending.append((position, messages, selected_docs))
+
+    if not pending:
+        return results
+
+    llm = get_llm()
+
+    with span("llm_call", model=Config.LLM_MODEL, requests=len(pending)) as stage:
+        responses = llm.batch(
+            [messages for _, messages, _ in pending],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+
+        stage["input_tokens"] = stage["output_tokens"] = stage["errors"] = 0
+
+        for (position, _, selected_docs), response in zip(pending, responses):
+            sources = format_sources(selected_docs)
+
+            if isinstance(response, Exception):
+                logger.warning(f"LLM call failed for query {position}: {response}")
+                stage["errors"] += 1
+                results[position] = {
+                    "answer": None,
+                    "sources": sources,
+                    "error": str(response),
+                }
+                continue
+
+            input_tokens, output_tokens = _usage(response)
+            stage["input_tokens"] += input_tokens
+            stage["output_tokens"] += output_tokens
+
+            results[position] = {
+                "answer": response.content.strip(),
+                "sources": sources,
+            }
+
+        record_tokens(
+            Config.LLM_MODEL,
+            stage["input_tokens"],
+            stage["output_tokens"],
+        )
+
+    return results
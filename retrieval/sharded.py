@@ -0,0 +1,622 @@
+"""
+Sharded scatter-gather index.
+
+Chunks are partitioned round-robin by chunk id across worker
+processes, each holding a DenseIndex + KeywordIndex shard (vectors
+and postings). The parent keeps the ChunkStore (texts, metadata,
+filters), the query-embedding cache and corpus-wide BM25 statistics.
+
+- Dense: every shard returns its top fetch_k; the parent merges
+  them into the global shortlist, fetches those vectors from their
+  shards and runs the same MMR as DenseIndex.
+- BM25: shards score with the corpus-wide IDF / average length
+  sent along with the queries, and per-shard top-k lists are merged.
+
+With float32 storage the hits equal the unsharded indices' (equal
+scores are ordered by chunk id in both). Shards talk to the parent
+over pipes; requests are tagged, so many sessions can have requests
+queued at a shard at once, and each shard serves them in order.
+"""
+
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from ingestion.chunkstore import ChunkStore
+from retrieval.dense import DenseIndex, QueryEmbedding, mmr_hits
+from retrieval.keyword import CorpusStats, KeywordIndex, bm25_idf, default_tokenize
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from retrieval.dense import Hits
+
+logger = get_logger(__name__)
+
+# Packed allowed-chunk bitmap sent to shards: (bits, number of ids)
+PackedMask = Optional[Tuple[np.ndarray, int]]
+
+# Chunk id ranges making up an index view
+Ranges = Tuple[range, ...]
+
+# Config settings read by shard processes (copied at start and by
+# ShardPool.sync_settings; nothing else is sent, e.g. no API key)
+SHARD_SETTINGS = (
+    "FILTER_GATHER_MAX",
+    "KEYWORD_QUERY_BATCH",
+    "RESCORE_FACTOR",
+    "VECTOR_CACHE_DIR",
+)
+
+
+def _shard_settings() -> Dict[str, Any]:
+    return {name: getattr(Config, name) for name in SHARD_SETTINGS}
+
+
+# ==========================================================
+# Shard Worker (runs in a child process)
+# ==========================================================
+
+class _Shard:
+    """
+    One partition of the corpus: dense + keyword index over the
+    chunk ids routed to it.
+    """
+
+    def __init__(self, dim: int, storage: str, bm25_params: Dict[str, float]):
+        self.dense = DenseIndex(None, dim, storage=storage)
+        self.keyword = KeywordIndex(**bm25_params)
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray, texts: List[str]) -> Tuple[Dict[str, int], int]:
+        """
+        Returns (document frequency delta, added token count).
+        """
+        self.dense.add(ids, vectors)
+        total = self.keyword.total_length
+        return self.keyword.add(ids, texts), self.keyword.total_length - total
+
+    def dense_candidates(self, query_vectors: np.ndarray, fetch_k: int, allowed: PackedMask, ranges: Ranges):
+        mask = _view_mask(self.dense.ids, allowed, ranges)
+        return self.dense.candidates(query_vectors, fetch_k, mask)
+
+    def vectors(self, ids: np.ndarray) -> np.ndarray:
+        return self.dense.vectors_for_ids(ids)
+
+    def keyword_search(self, queries, k: int, allowed: PackedMask, ranges: Ranges, corpus: CorpusStats):
+        mask = _view_mask(self.keyword.ids, allowed, ranges)
+        return self.keyword.search(queries, k, mask, corpus)
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        for name, value in settings.items():
+            setattr(Config, name, value)
+
+    def stats(self) -> Dict[str, int]:
+        return {"chunks": len(self.dense), "vocabulary": len(self.keyword._vocab)}
+
+
+def _shard_main(conn, dim: int, storage: str, bm25_params: Dict, settings: Dict) -> None:
+    shard = _Shard(dim, storage, bm25_params)
+    shard.configure(settings)  # same tuning as the parent
+
+    # Requests are served one at a time, in arrival order
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        tag, method, args = message
+        try:
+            conn.send((tag, True, getattr(shard, method)(*args)))
+        except Exception as e:
+            conn.send((tag, False, f"{type(e).__name__}: {e}"))
+
+
+def _pack(mask: Optional[np.ndarray]) -> PackedMask:
+    if mask is None:
+        return None
+    return np.packbits(mask, bitorder="little"), len(mask)
+
+
+def _unpack(packed: PackedMask, ids: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Boolean mask covering every id in `ids` (ids beyond the
+    packed range are not allowed).
+    """
+    if packed is None:
+        return None
+
+    bits, count = packed
+    size = max(count, int(ids[-1]) + 1 if len(ids) else 0)
+    mask = np.zeros(size, dtype=bool)
+    mask[:count] = np.unpackbits(bits, count=count, bitorder="little").astype(bool)
+    return mask
+
+
+def _view_mask(ids: np.ndarray, allowed: PackedMask, ranges: Ranges) -> Optional[np.ndarray]:
+    """
+    Mask of the shard's chunks that are in the view (`ranges`) and
+    allowed; None when that is every chunk. Shards also hold chunks
+    added by newer views, so the view is always checked here.
+    """
+    mask = _unpack(allowed, ids)
+
+    inside = sum(
+        int(np.searchsorted(ids, r.stop) - np.searchsorted(ids, r.start)) for r in ranges
+    )
+    if inside == len(ids):
+        return mask
+
+    if mask is None:
+        mask = np.zeros(int(ids[-1]) + 1, dtype=bool)
+        for r in ranges:
+            mask[r.start : r.stop] = True
+        return mask
+
+    in_view = np.zeros(len(mask), dtype=bool)
+    for r in ranges:
+        in_view[r.start : r.stop] = True
+    return mask & in_view
+
+
+# ==========================================================
+# Shard Pool (parent side)
+# ==========================================================
+
+class ShardPool:
+    """
+    Worker processes plus their pipes. scatter() sends one request
+    to every shard, then waits for the replies, so shards work in
+    parallel. Requests carry a tag and a reader thread per shard
+    hands each reply to its caller, so concurrent callers (chat
+    sessions) only take turns writing to a pipe, not for a whole
+    round trip.
+    """
+
+    def __init__(self, shards: int, dim: int, storage: str, bm25_params: Dict[str, float]):
+        context = multiprocessing.get_context("spawn")
+
+        self.size = shards
+        self.error: Optional[str] = None  # set once the pool is unusable
+        self._lock = threading.Lock()  # error + pending replies
+        self._tags = itertools.count()
+        self._pending: List[Dict[int, Future]] = [{} for _ in range(shards)]
+        self._send_locks = [threading.Lock() for _ in range(shards)]
+        self._conns = []
+        self._processes = []
+
+        for number in range(shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_shard_main,
+                args=(child_conn, dim, storage, bm25_params, _shard_settings()),
+                name=f"index-shard-{number}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+
+        self._finalizer = weakref.finalize(self, _shutdown, self._conns, self._processes)
+
+        # Reader threads hold the pool weakly, so dropping the
+        # pool still shuts the shards down
+        for number, conn in enumerate(self._conns):
+            threading.Thread(
+                target=_read_replies,
+                args=(weakref.ref(self), number, conn),
+                name=f"index-shard-{number}-replies",
+                daemon=True,
+            ).start()
+
+        logger.info(f"Started {shards} index shards")
+
+    def scatter(self, method: str, args: Sequence[Tuple]) -> List[Any]:
+        """
+        Calls `method` on every shard with its own argument tuple.
+        A shard process dying fails the pool for good: the dead
+        shard's chunks are gone, so the index has to be rebuilt.
+        """
+        tag = next(self._tags)
+        futures = []
+
+        for number, (conn, shard_args) in enumerate(zip(self._conns, args)):
+            future: Future = Future()
+            with self._lock:
+                if self.error is not None:
+                    raise RuntimeError(f"Index shards unavailable: {self.error}")
+                self._pending[number][tag] = future
+
+            try:
+                with self._send_locks[number]:
+                    conn.send((tag, method, shard_args))
+            except OSError as e:
+                self._fail(number, method)
+                raise RuntimeError(f"Index {self.error}; rebuild the index") from e
+
+            futures.append(future)
+
+        replies = [future.result() for future in futures]
+
+        for number, (ok, value) in enumerate(replies):
+            if not ok:
+                raise RuntimeError(f"Index shard {number} failed in {method}: {value}")
+
+        return [value for _, value in replies]
+
+    def broadcast(self, method: str, *args) -> List[Any]:
+        return self.scatter(method, [args] * self.size)
+
+    def sync_settings(self) -> None:
+        """
+        Copies the current SHARD_SETTINGS values to the shards
+        (after changing Config at runtime).
+        """
+        self.broadcast("configure", _shard_settings())
+
+    def close(self) -> None:
+        with self._lock:
+            self.error = self.error or "pool closed"
+        self._finalizer()
+        self._fail_pending(RuntimeError("Index shards closed"))
+
+    # ------------------------------
+    # Replies
+    # ------------------------------
+    def _deliver(self, number: int, message: Tuple[int, bool, Any]) -> None:
+        tag, ok, value = message
+        with self._lock:
+            future = self._pending[number].pop(tag, None)
+        if future is not None:
+            future.set_result((ok, value))
+
+    def _fail(self, number: int, method: Optional[str] = None) -> None:
+        """
+        Marks the pool failed after shard `number` died; stops the
+        other shards and fails every waiting request.
+        """
+        process = self._processes[number]
+        process.join(timeout=1)
+
+        with self._lock:
+            if self.error is not None:
+                return
+            self.error = (
+                f"shard {number} exited (code {process.exitcode})"
+                + (f" during {method}" if method else "")
+            )
+
+        logger.error(f"Index {self.error}")
+        for other in self._processes:
+            other.terminate()
+        self._finalizer()
+        self._fail_pending(RuntimeError(f"Index {self.error}; rebuild the index"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        with self._lock:
+            futures = [f for pending in self._pending for f in pending.values()]
+            for pending in self._pending:
+                pending.clear()
+        for future in futures:
+            future.set_exception(error)
+
+
+def _read_replies(pool_ref, number: int, conn) -> None:
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            pool = pool_ref()
+            if pool is not None:
+                pool._fail(number)
+            return
+
+        pool = pool_ref()
+        if pool is None:
+            return
+        pool._deliver(number, message)
+        del pool
+
+
+def _shutdown(conns, processes) -> None:
+    for conn in conns:
+        try:
+            conn.send(None)
+            conn.close()
+        except OSError:
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+
+
+# ==========================================================
+# Sharded Index (dense interface)
+# ==========================================================
+
+class ShardedIndex(QueryEmbedding):
+    """
+    Drop-in for DenseIndex whose vectors and BM25 postings live in
+    shard processes; `keyword` is the matching KeywordIndex
+    stand-in for hybrid retrieval.
+
+    Indices built from one pool are views: copy() + add() extends
+    the shards, and older views keep answering over the chunks and
+    corpus statistics they were built with (copy-on-write updates
+    through IndexHandle).
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        dim: int,
+        shards: Optional[int] = None,
+        storage: Optional[str] = None,
+        store: Optional[ChunkStore] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ):
+        self.embeddings = embeddings
+        self.storage = storage or Config.EMBEDDING_STORAGE
+        self.store = store if store is not None else ChunkStore()
+        self.bm25_params = {"k1": k1, "b": b, "epsilon": epsilon}
+        self.pool = ShardPool(shards or Config.INDEX_SHARDS, dim, self.storage, self.bm25_params)
+        self._dim = dim
+
+        # Contents of this view
+        self._ranges: Tuple[range, ...] = ()
+        self._count = 0
+        self._df: Dict[str, int] = {}
+        self._total_len = 0
+        self._idf: Optional[Dict[str, float]] = None
+
+        self._init_query_cache()
+        self.keyword = ShardedKeywordIndex(self)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    @property
+    def ids(self) -> np.ndarray:
+        """
+        Chunk ids in this view, ascending (as DenseIndex.ids).
+        """
+        if not self._ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(r.start, r.stop, dtype=np.int64) for r in self._ranges])
+
+    @property
+    def failed(self) -> Optional[str]:
+        """
+        Why the shards are unusable (the index must be rebuilt),
+        or None.
+        """
+        return self.pool.error
+
+    # ------------------------------
+    # Storage
+    # ------------------------------
+    def add(self, ids: Sequence[int], vectors) -> None:
+        """
+        Routes chunks (already in the store) to shards by id.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        if len(vectors) != len(ids):
+            raise ValueError("ids and vectors must have the same length")
+
+        texts = self.store.texts(ids)
+        shard_of = ids % self.pool.size
+
+        args = []
+        for number in range(self.pool.size):
+            rows = np.flatnonzero(shard_of == number)
+            args.append((ids[rows], vectors[rows], [texts[r] for r in rows]))
+
+        added = self.pool.scatter("add", args)
+
+        df = dict(self._df)
+        for shard_df, length in added:
+            for term, count in shard_df.items():
+                df[term] = df.get(term, 0) + count
+            self._total_len += length
+
+        self._df = df
+        self._ranges += (range(int(ids[0]), int(ids[-1]) + 1),) if len(ids) else ()
+        self._count += len(ids)
+        self._idf = None
+
+    def copy(self) -> "ShardedIndex":
+        """
+        New view on the same shards (see class docstring).
+        """
+        clone = ShardedIndex.__new__(ShardedIndex)
+        clone.__dict__.update(self.__dict__)
+        self._copy_query_cache(clone)
+        clone.keyword = ShardedKeywordIndex(clone)
+        return clone
+
+    def shard_stats(self) -> List[Dict[str, int]]:
+        return self.pool.broadcast("stats")
+
+    def _visible(self, allowed: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """
+        `allowed` restricted to this view's chunks, or None when
+        nothing is filtered (shards apply the view's ranges).
+        """
+        if allowed is None:
+            return None
+
+        mask = np.zeros(len(self.store), dtype=bool)
+        for r in self._ranges:
+            mask[r.start : r.stop] = True
+
+        mask[: len(allowed)] &= allowed
+        mask[len(allowed) :] = False
+        return mask
+
+    # ------------------------------
+    # Dense Search
+    # ------------------------------
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        k: int = None,
+        fetch_k: int = None,
+        lambda_mult: float = None,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[Hits]:
+        """
+        Scatter-gather MMR search; same arguments and results as
+        DenseIndex.search.
+        """
+        k = k or Config.FETCH_K
+        lambda_mult = Config.MMR_LAMBDA if lambda_mult is None else lambda_mult
+
+        from ingestion.quantization import truncate_and_normalize
+
+        allowed = self._visible(allowed)
+        size = self._count if allowed is None else int(np.count_nonzero(allowed))
+
+        fetch_k = min(max(fetch_k or Config.MMR_FETCH_K, k), size)
+        query_vectors = truncate_and_normalize(query_vectors, None)
+
+        if fetch_k == 0:
+            return [[] for _ in range(len(query_vectors))]
+
+        packed = _pack(allowed)
+        step = Config.DENSE_QUERY_BATCH
+        results: List[Hits] = []
+
+        for start in range(0, len(query_vectors), step):
+            block = query_vectors[start : start + step]
+            shortlist = self._merge_shortlists(block, fetch_k, packed)
+            results.extend(
+                mmr_hits(block, shortlist, self._gather(shortlist), k, lambda_mult)
+            )
+
+        return results
+
+    def _merge_shortlists(self, block: np.ndarray, fetch_k: int, packed: PackedMask) -> np.ndarray:
+        """
+        Global top fetch_k chunk ids per query from the shards'
+        shortlists (score descending, then chunk id).
+        """
+        replies = self.pool.broadcast("dense_candidates", block, fetch_k, packed, self._ranges)
+
+        scores = np.concatenate([s for s, _ in replies], axis=1)
+        ids = np.concatenate([i for _, i in replies], axis=1)
+        scores = np.where(ids >= 0, scores, -np.inf)
+
+        order = np.lexsort((ids, -scores))[:, :fetch_k]
+        shortlist = np.take_along_axis(ids, order, axis=1)
+        return np.where(np.isfinite(np.take_along_axis(scores, order, axis=1)), shortlist, -1)
+
+    def _gather(self, shortlist: np.ndarray) -> np.ndarray:
+        """
+        (n, m, d) vectors of the shortlisted chunks from their shards.
+        """
+        candidate_vectors = np.zeros((*shortlist.shape, self._dim), dtype=np.float32)
+        valid = shortlist >= 0
+
+        selections = [valid & (shortlist % self.pool.size == n) for n in range(self.pool.size)]
+        replies = self.pool.scatter("vectors", [(shortlist[sel],) for sel in selections])
+
+        for sel, vectors in zip(selections, replies):
+            candidate_vectors[sel] = vectors
+
+        return candidate_vectors
+
+    def search_documents(self, query: str, k: int = None) -> List[Document]:
+        hits = self.search(self.embed_queries([query]), k=k)[0]
+        return self.store.documents(chunk_id for chunk_id, _ in hits)
+
+    # ------------------------------
+    # Keyword Search
+    # ------------------------------
+    def _corpus_stats(self, queries: Sequence[str]) -> CorpusStats:
+        """
+        Corpus-wide IDF for the query terms + average length.
+        """
+        if self._idf is None:
+            df = np.fromiter(self._df.values(), dtype=np.float64, count=len(self._df))
+            idf = bm25_idf(df, self._count, self.bm25_params["epsilon"])
+            self._idf = dict(zip(self._df, idf.tolist()))
+
+        terms = {t for query in queries for t in default_tokenize(query)}
+        avgdl = self._total_len / self._count if self._count else 0.0
+
+        return CorpusStats(
+            idf={t: self._idf[t] for t in terms if t in self._idf},
+            avgdl=avgdl,
+        )
+
+
+class ShardedKeywordIndex:
+    """
+    KeywordIndex interface over the shards of a ShardedIndex.
+    """
+
+    def __init__(self, index: ShardedIndex):
+        self.index = index
+        self.store = index.store
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def search(
+        self,
+        queries: Sequence[str],
+        k: int = None,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[Hits]:
+        """
+        Per-shard BM25 top-k with corpus-wide statistics, merged
+        (score descending, then chunk id).
+        """
+        k = k or Config.FETCH_K
+        index = self.index
+
+        allowed = index._visible(allowed)
+        if not len(index) or (allowed is not None and not allowed.any()):
+            return [[] for _ in queries]
+
+        replies = index.pool.broadcast(
+            "keyword_search",
+            list(queries),
+            k,
+            _pack(allowed),
+            index._ranges,
+            index._corpus_stats(queries),
+        )
+
+        results = []
+        for row in range(len(queries)):
+            hits = [hit for shard_hits in replies for hit in shard_hits[row]]
+            hits.sort(key=lambda hit: (-hit[1], hit[0]))
+            results.append(hits[:k])
+
+        return results
+
+    def search_documents(self, query: str, k: int = None) -> List[Document]:
+        hits = self.search([query], k)[0]
+        return self.store.documents(chunk_id for chunk_id, _ in hits)
@@ -0,0 +1,21 @@
+import os
+import sys
+
+# Tests import the app modules the way app.py does (repo root on the path)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """
+    Deterministic local embeddings in place of the Gemini client.
+    """
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    import ingestion.embeddings
+
+    model = DeterministicFakeEmbedding(size=32)
+    monkeypatch.setattr(ingestion.embeddings, "_embedding_instance", model)
+    return model
@@ -0,0 +1,85 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from benchmarks.chunking import synthetic_texts
+from config import Config
+from ingestion.chunking import (
+    SEPARATORS,
+    chunk_documents,
+    chunk_documents_limited,
+    split_spans,
+    split_texts,
+    token_length,
+)
+
+EDGE_CASES = [
+    "",
+    "   \n\n  ",
+    "one",
+    "x" * 2500,  # no separator at all
+    "a.b.c." * 300,
+    "word " * 600,
+    "\n\n\n".join(["para " * 50] * 6),
+    "Ünïcødé 文字 " * 200 + "\n" + "émoji 🙂. " * 150,
+    "  leading and trailing whitespace  \n\n" * 40,
+]
+
+
+def reference(text, size, overlap):
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=size, chunk_overlap=overlap, separators=SEPARATORS, strip_whitespace=True
+    )
+    return splitter.split_text(text)
+
+
+def spans_text(text, size, overlap):
+    return [text[s:e] for s, e in split_spans(text, size, overlap)]
+
+
+@pytest.mark.parametrize("size, overlap", [(1000, 200), (300, 50), (120, 0), (50, 49)])
+@pytest.mark.parametrize("text", synthetic_texts(4, 8000) + EDGE_CASES)
+def test_split_spans_matches_langchain(text, size, overlap):
+    assert spans_text(text, size, overlap) == reference(text, size, overlap)
+
+
+def test_process_pool_matches_serial(monkeypatch):
+    texts = synthetic_texts(6, 20000, seed=1)
+    serial = split_texts(texts)
+
+    monkeypatch.setattr(Config, "CHUNK_PARALLEL_MIN_CHARS", 0)
+    monkeypatch.setattr(Config, "CHUNK_WORKERS", 2)
+    assert split_texts(texts) == serial
+
+
+def test_chunk_documents_records_offsets_and_metadata():
+    texts = synthetic_texts(3, 5000, seed=2)
+    docs = [Document(page_content=t, metadata={"source": f"doc{i}"}) for i, t in enumerate(texts)]
+
+    chunks = chunk_documents(docs)
+
+    assert chunks
+    assert len({c.metadata["chunk_id"] for c in chunks}) == len(chunks)
+    for chunk in chunks:
+        text = texts[int(chunk.metadata["source"][3:])]
+        start = chunk.metadata["start_index"]
+        assert text[start : start + len(chunk.page_content)] == chunk.page_content
+
+
+def test_dropped_chunks_are_counted(monkeypatch):
+    docs = [Document(page_content=t, metadata={}) for t in synthetic_texts(2, 5000, seed=3)]
+    total = len(chunk_documents(docs))
+
+    monkeypatch.setattr(Config, "MAX_TOTAL_CHUNKS", total - 3)
+    chunks, dropped = chunk_documents_limited(docs)
+    assert (len(chunks), dropped) == (total - 3, 3)
+
+
+def test_token_sized_chunks_stay_within_the_limit():
+    text = synthetic_texts(1, 20000, seed=4)[0]
+    length = token_length(text)
+
+    spans = split_spans(text, 100, 20, length=length)
+
+    assert len(spans) > 1
+    assert all(length(s, e) <= 100 for s, e in spans)
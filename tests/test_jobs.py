@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+import requests
+from langchain_core.documents import Document
+
+from config import Config
+from ingestion.jobs import (
+    CANCELLED,
+    FAILED,
+    SUCCEEDED,
+    IndexHandle,
+    IngestionScheduler,
+)
+from ingestion.loaders import load_web
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch, fake_embeddings):
+    monkeypatch.setattr(Config, "INGEST_RETRY_BACKOFF", 0.01)
+
+
+def documents(n, source="a.txt"):
+    return [
+        Document(page_content=f"chunk {i} about cats and dogs", metadata={"source": source})
+        for i in range(n)
+    ]
+
+
+def run(loaders, max_retries=2):
+    handle = IndexHandle()
+    scheduler = IngestionScheduler(handle, max_workers=1, max_retries=max_retries)
+    job = scheduler.submit("test", loaders)
+    scheduler.shutdown(cancel=False, wait=True)
+    return job, handle
+
+
+def flaky(failures, result):
+    calls = []
+
+    def load():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise ConnectionError("temporary")
+        return result
+
+    return load, calls
+
+
+def test_transient_failure_is_retried():
+    loader, calls = flaky(2, documents(3))
+    job, handle = run([loader])
+
+    assert job.status == SUCCEEDED
+    assert job.retries == 2
+    assert len(calls) == 3
+    assert len(handle.snapshot()[0]) == 3
+
+
+def test_persistent_failure_fails_job_and_keeps_indices():
+    loader, calls = flaky(10, documents(3))
+    job, handle = run([loader], max_retries=1)
+
+    assert job.status == FAILED
+    assert "temporary" in job.error
+    assert len(calls) == 2
+    assert handle.snapshot() == (None, None)
+    assert handle.version == 0
+
+
+def test_cancel_during_loading():
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return documents(3)
+
+    handle = IndexHandle()
+    scheduler = IngestionScheduler(handle, max_workers=1)
+    job = scheduler.submit("test", [slow, slow])
+
+    assert started.wait(5)
+    scheduler.cancel(job.id)
+    release.set()
+    scheduler.shutdown(cancel=False, wait=True)
+
+    assert job.status == CANCELLED
+    assert handle.version == 0
+
+
+def test_cancel_interrupts_retry_backoff(monkeypatch):
+    monkeypatch.setattr(Config, "INGEST_RETRY_BACKOFF", 30.0)
+    loader, calls = flaky(10, documents(1))
+
+    handle = IndexHandle()
+    scheduler = IngestionScheduler(handle, max_workers=1)
+    job = scheduler.submit("test", [loader])
+
+    deadline = time.monotonic() + 5
+    while job.retries == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.cancel(job.id)
+    scheduler.shutdown(cancel=False, wait=True)
+
+    assert job.status == CANCELLED
+    assert len(calls) == 1
+
+
+def test_second_job_extends_committed_indices():
+    handle = IndexHandle()
+    scheduler = IngestionScheduler(handle, max_workers=1)
+    first = scheduler.submit("first", [lambda: documents(3, "a.txt")])
+    second = scheduler.submit("second", [lambda: documents(2, "b.txt")])
+    scheduler.shutdown(cancel=False, wait=True)
+
+    assert first.status == second.status == SUCCEEDED
+    vectorstore, bm25 = handle.snapshot()
+    assert len(vectorstore) == len(bm25) == 5
+    assert handle.version == 2
+
+
+def test_load_web_failure_on_start_page_is_retried(monkeypatch):
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        raise requests.exceptions.ConnectionError("unreachable")
+
+    monkeypatch.setattr(requests, "get", get)
+    job, handle = run([lambda: load_web("https://example.com")], max_retries=1)
+
+    assert job.status == FAILED
+    assert "unreachable" in job.error
+    assert len(calls) == 2
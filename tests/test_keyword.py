@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from retrieval.keyword import KeywordIndex
+
+
+def make_corpus(n, vocabulary=400, seed=0):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(vocabulary)]
+    # Zipf-like: frequent terms get negative (floored) IDF
+    weights = [1 / (i + 1) for i in range(vocabulary)]
+    return [" ".join(rng.choices(words, weights, k=rng.randint(3, 40))) for _ in range(n)]
+
+
+def build(texts):
+    index = KeywordIndex()
+    index.add(range(len(texts)), texts)
+    return index
+
+
+def all_scores(index, query):
+    scores = np.zeros(len(index))
+    for chunk_id, score in index.search([query], k=len(index))[0]:
+        scores[chunk_id] = score
+    return scores
+
+
+QUERIES = ["w0 w5 w17", "w3", "w250 w251 w3 w3", "unknown w40"]
+
+
+def test_scores_match_bm25okapi():
+    texts = make_corpus(300)
+    index = build(texts)
+    reference = BM25Okapi([t.split() for t in texts])
+
+    for query in QUERIES:
+        expected = reference.get_scores(query.split())
+        np.testing.assert_allclose(all_scores(index, query), expected, rtol=1e-5, atol=1e-5)
+
+
+def test_top_k_matches_bm25okapi_ranking():
+    texts = make_corpus(300, seed=1)
+    index = build(texts)
+    reference = BM25Okapi([t.split() for t in texts])
+
+    hits = index.search(QUERIES, k=10)
+
+    for query, query_hits in zip(QUERIES, hits):
+        expected = np.sort(reference.get_scores(query.split()))[::-1][:10]
+        assert len(query_hits) == 10
+        np.testing.assert_allclose([s for _, s in query_hits], expected, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("n", [1, 2])
+def test_tiny_corpus_still_returns_top_k(n):
+    # Every floored IDF is <= 0 here; BM25Okapi still ranks the chunks
+    texts = ["cats and dogs", "dogs and birds"][:n]
+    index = build(texts)
+    reference = BM25Okapi([t.split() for t in texts])
+
+    hits = index.search(["dogs"], k=5)[0]
+
+    assert len(hits) == n
+    expected = reference.get_scores(["dogs"])
+    for chunk_id, score in hits:
+        assert score == pytest.approx(expected[chunk_id], abs=1e-6)
+
+
+def test_equal_scores_ordered_by_chunk_id():
+    index = build(["alpha beta", "gamma", "alpha beta", "delta", "epsilon"])
+
+    hits = index.search(["alpha"], k=4)[0]
+
+    assert [chunk_id for chunk_id, _ in hits] == [0, 2, 1, 3]
+
+
+def test_incremental_add_matches_single_build():
+    texts = make_corpus(120, seed=2)
+    whole = build(texts)
+
+    incremental = KeywordIndex()
+    incremental.add(range(50), texts[:50])
+    incremental.add(range(50, 120), texts[50:])
+
+    assert whole.search(QUERIES, k=20) == incremental.search(QUERIES, k=20)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from ingestion.chunkstore import ChunkStore
+from retrieval.keyword import CorpusStats, KeywordIndex, bm25_idf
+from test_keyword import make_corpus
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    texts = make_corpus(3000, vocabulary=200, seed=5)
+    store = ChunkStore()
+    ids = store.append(
+        [Document(page_content=t, metadata={"source": f"s{i % 50}"}) for i, t in enumerate(texts)]
+    )
+    index = KeywordIndex(store=store)
+    index.add(ids)
+    return store, index
+
+
+def expected(index, query, allowed, k, stats=None):
+    scores = np.zeros(len(index))
+    for chunk_id, score in index.search([query], k=len(index), corpus=stats)[0]:
+        scores[chunk_id] = score
+    inside = np.flatnonzero(allowed)
+    order = inside[np.lexsort((inside, -scores[inside]))][:k]
+    return [(int(i), scores[i]) for i in order]
+
+
+@pytest.mark.parametrize("sources", [["s7"], ["s1", "s2"], [f"s{i}" for i in range(40)]])
+@pytest.mark.parametrize("query", ["w0 w1", "w3 w17 w150", "w0 w0 w2"])
+def test_scoped_scores_equal_unscoped(corpus, sources, query):
+    store, index = corpus
+    allowed = store.select({"source": sources})
+
+    hits = index.search([query], k=10, allowed=allowed)[0]
+
+    assert all(allowed[chunk_id] for chunk_id, _ in hits)
+    want = expected(index, query, allowed, 10)
+    assert [c for c, _ in hits] == [c for c, _ in want]
+    np.testing.assert_allclose([s for _, s in hits], [s for _, s in want], rtol=1e-6)
+
+
+@pytest.mark.parametrize("sources", [["s7"], [f"s{i}" for i in range(40)]])
+def test_scoped_search_with_corpus_stats(corpus, sources):
+    store, index = corpus
+    allowed = store.select({"source": sources})
+    terms = ["w0", "w5", "w120"]
+
+    # Statistics of a larger corpus, as a shard would receive
+    df = np.array([sum(1 for t in store.texts(range(len(store))) if term in t.split()) for term in terms])
+    stats = CorpusStats(
+        idf=dict(zip(terms, bm25_idf(df, 2 * len(index), index.epsilon).tolist())),
+        avgdl=1.5 * index.avgdl,
+    )
+    query = " ".join(terms)
+    hits = index.search([query], k=10, allowed=allowed, corpus=stats)[0]
+
+    assert hits == expected(index, query, allowed, 10, stats)
+
+
+def test_values_limited_to_ids():
+    store = ChunkStore()
+    store.append([Document(page_content="a", metadata={"source": s}) for s in ["x", "y", "x", "z"]])
+    store.append([Document(page_content="b", metadata={})])
+
+    assert store.values("source") == ["x", "y", "z"]
+    assert store.values("source", np.array([0, 2, 4])) == ["x"]
+    assert store.values("source", np.array([3, 1])) == ["y", "z"]
+    assert store.values("source", np.empty(0, dtype=np.int64)) == []
+    assert store.values("missing", np.array([0])) == []
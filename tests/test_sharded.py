@@ -0,0 +1,157 @@
+import threading
+
+import numpy as np
+import pytest
+
+from config import Config
+from ingestion.chunkstore import ChunkStore
+from retrieval.dense import DenseIndex
+from retrieval.keyword import KeywordIndex
+from retrieval.sharded import ShardedIndex
+
+DIM = 16
+N = 120
+
+
+def corpus(n, seed=0):
+    """
+    Texts + unit vectors with copies of chunk 0, so equal scores
+    occur on both the dense and the BM25 side.
+    """
+    from langchain_core.documents import Document
+
+    rng = np.random.default_rng(seed)
+    texts = [f"w{i % 7} w{i % 13} w{i % 5} common" for i in range(n)]
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    for i in (17, 58, 91):
+        texts[i], vectors[i] = texts[0], vectors[0]
+
+    documents = [
+        Document(page_content=t, metadata={"source_type": ["pdf", "web", "youtube"][i % 3]})
+        for i, t in enumerate(texts)
+    ]
+    return documents, vectors
+
+
+@pytest.fixture(scope="module")
+def indices():
+    documents, vectors = corpus(N)
+    store = ChunkStore()
+    ids = store.append(documents)
+
+    dense = DenseIndex(None, DIM, storage="float32", store=store)
+    dense.add(ids, vectors)
+    keyword = KeywordIndex(store=store)
+    keyword.add(ids)
+
+    sharded = ShardedIndex(None, DIM, shards=2, storage="float32", store=store)
+    sharded.add(ids, vectors)
+
+    yield store, dense, keyword, sharded, vectors
+    sharded.pool.close()
+
+
+@pytest.fixture
+def gather_max(indices):
+    """
+    Sets FILTER_GATHER_MAX here and in the shards, restoring both.
+    """
+    sharded = indices[3]
+    before = Config.FILTER_GATHER_MAX
+
+    def set_gather_max(value):
+        Config.FILTER_GATHER_MAX = value
+        sharded.pool.sync_settings()
+
+    yield set_gather_max
+    set_gather_max(before)
+
+
+def queries_for(vectors):
+    query_vectors = np.concatenate([vectors[:3], vectors[40:45]])
+    queries = ["w0 w0 common", "w3 w8", "w2 w11 w4", "missing", "common"]
+    return query_vectors, queries
+
+
+@pytest.mark.parametrize(
+    "filters, gather_max_value",
+    [(None, None), ({"source_type": "pdf"}, N), ({"source_type": "pdf"}, 0)],
+    ids=["unscoped", "scope-gather", "scope-bitmap"],
+)
+def test_matches_unsharded(indices, gather_max, filters, gather_max_value):
+    store, dense, keyword, sharded, vectors = indices
+    if gather_max_value is not None:
+        gather_max(gather_max_value)
+
+    allowed = store.select(filters)
+    query_vectors, queries = queries_for(vectors)
+
+    assert sharded.search(query_vectors, k=6, allowed=allowed) == dense.search(
+        query_vectors, k=6, allowed=allowed
+    )
+    assert sharded.keyword.search(queries, k=6, allowed=allowed) == keyword.search(
+        queries, k=6, allowed=allowed
+    )
+
+
+def test_concurrent_sessions(indices):
+    _, dense, keyword, sharded, vectors = indices
+    query_vectors, queries = queries_for(vectors)
+    expected = (dense.search(query_vectors, k=5), keyword.search(queries, k=5))
+
+    results = []
+    barrier = threading.Barrier(8)
+
+    def session():
+        barrier.wait()
+        for _ in range(5):
+            results.append(
+                (sharded.search(query_vectors, k=5), sharded.keyword.search(queries, k=5))
+            )
+
+    threads = [threading.Thread(target=session) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 40
+    assert all(result == expected for result in results)
+
+
+def test_view_unchanged_by_concurrent_add():
+    documents, vectors = corpus(2 * N, seed=1)
+    store = ChunkStore()
+    first = store.append(documents[:N])
+
+    dense = DenseIndex(None, DIM, storage="float32", store=store)
+    dense.add(first, vectors[:N])
+    keyword = KeywordIndex(store=store)
+    keyword.add(first)
+
+    sharded = ShardedIndex(None, DIM, shards=2, storage="float32", store=store)
+    try:
+        sharded.add(first, vectors[:N])
+        query_vectors, queries = queries_for(vectors)
+        expected = (dense.search(query_vectors, k=5), keyword.search(queries, k=5))
+
+        def extend():
+            newer = sharded.copy()
+            for start in range(N, 2 * N, 20):
+                ids = store.append(documents[start : start + 20])
+                newer.add(ids, vectors[start : start + 20])
+
+        writer = threading.Thread(target=extend)
+        writer.start()
+        while writer.is_alive():
+            assert sharded.search(query_vectors, k=5) == expected[0]
+            assert sharded.keyword.search(queries, k=5) == expected[1]
+        writer.join()
+
+        assert sharded.search(query_vectors, k=5) == expected[0]
+        assert sharded.keyword.search(queries, k=5) == expected[1]
+    finally:
+        sharded.pool.close()
+
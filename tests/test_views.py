@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+
+from config import Config
+from ingestion.chunkstore import ChunkStore
+from retrieval.dense import DenseIndex
+from retrieval.keyword import KeywordIndex
+
+DIM = 16
+
+
+def documents(n, offset=0):
+    from langchain_core.documents import Document
+
+    return [
+        Document(
+            page_content=f"w{i % 7} w{i % 11} shared w{(offset + i) % 5}",
+            metadata={"source_type": ["pdf", "web"][i % 2]},
+        )
+        for i in range(n)
+    ]
+
+
+def unit(rng, n):
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def indices():
+    rng = np.random.default_rng(0)
+    store = ChunkStore()
+    ids = store.append(documents(40))
+    dense = DenseIndex(None, DIM, storage="float32", store=store)
+    dense.add(ids, unit(rng, 40))
+    keyword = KeywordIndex(store=store)
+    keyword.add(ids)
+    return store, dense, keyword, rng
+
+
+def extend(store, dense, keyword, rng, n, offset=0):
+    ids = store.append(documents(n, offset))
+    dense.add(ids, unit(rng, n))
+    keyword.add(ids)
+    return ids
+
+
+def search_all(store, dense, keyword, queries, texts, monkeypatch):
+    """
+    Dense + BM25 hits on every shortlist path.
+    """
+    results = []
+    for gather_max, filters in [(0, None), (10**6, {"source_type": "pdf"}), (0, {"source_type": "pdf"})]:
+        monkeypatch.setattr(Config, "FILTER_GATHER_MAX", gather_max)
+        allowed = store.select(filters)
+        results.append((dense.search(queries, k=5, allowed=allowed), keyword.search(texts, k=5, allowed=allowed)))
+    return results
+
+
+@pytest.mark.parametrize("storage", ["float32", "int8"])
+def test_copy_shares_storage_and_original_is_unchanged(storage, monkeypatch):
+    rng = np.random.default_rng(1)
+    store = ChunkStore()
+    ids = store.append(documents(40))
+    dense = DenseIndex(None, DIM, storage=storage, store=store)
+    dense.add(ids, unit(rng, 40))
+    keyword = KeywordIndex(store=store)
+    keyword.add(ids)
+
+    queries, texts = unit(rng, 4), ["w1 shared", "w3 w4", "w2", "shared"]
+    before = search_all(store, dense, keyword, queries, texts, monkeypatch)
+
+    new_dense, new_keyword = dense.copy(), keyword.copy()
+    assert new_dense.index is dense.index
+    assert new_keyword._postings is keyword._postings
+
+    new_ids = extend(store, new_dense, new_keyword, rng, 30, offset=3)
+
+    assert len(dense) == len(keyword) == 40
+    assert len(new_dense) == len(new_keyword) == 70
+    assert search_all(store, dense, keyword, queries, texts, monkeypatch) == before
+
+    # The new view finds the new chunks
+    hits = new_dense.search(new_dense.vectors(np.arange(40, 70)), k=1, fetch_k=1)
+    assert [h[0][0] for h in hits] == list(new_ids)
+
+
+def test_views_match_a_fresh_build(monkeypatch):
+    rng = np.random.default_rng(2)
+    vectors = unit(rng, 65)
+    store = ChunkStore()
+    ids = store.append(documents(40) + documents(25, offset=2))
+
+    dense = DenseIndex(None, DIM, storage="float32", store=store)
+    dense.add(ids[:40], vectors[:40])
+    keyword = KeywordIndex(store=store)
+    keyword.add(ids[:40])
+
+    new_dense, new_keyword = dense.copy(), keyword.copy()
+    new_dense.add(ids[40:], vectors[40:])
+    new_keyword.add(ids[40:])
+
+    fresh_dense = DenseIndex(None, DIM, storage="float32", store=store)
+    fresh_dense.add(ids, vectors)
+    fresh_keyword = KeywordIndex(store=store)
+    fresh_keyword.add(ids)
+
+    queries, texts = unit(rng, 3), ["w1 shared", "w6 w10", "w4"]
+    assert search_all(store, new_dense, new_keyword, queries, texts, monkeypatch) == search_all(
+        store, fresh_dense, fresh_keyword, queries, texts, monkeypatch
+    )
+
+
+def test_terms_added_by_newer_views_are_unknown_to_older_ones(indices):
+    store, dense, keyword, rng = indices
+    new_keyword = keyword.copy()
+    new_keyword.add(store.append(documents(1)), ["brandnew term"])
+
+    assert all(score == 0 for _, score in keyword.search(["brandnew"], k=5)[0])
+    assert new_keyword.search(["brandnew"], k=5)[0][0][0] == 40
+
+
+def test_extending_a_stale_view_detaches_it(indices, monkeypatch):
+    store, dense, keyword, rng = indices
+    queries, texts = unit(rng, 3), ["w1 shared", "w2 w3", "w5"]
+
+    first_dense, first_keyword = dense.copy(), keyword.copy()
+    extend(store, first_dense, first_keyword, rng, 10)
+    first = search_all(store, first_dense, first_keyword, queries, texts, monkeypatch)
+
+    # A second copy of the same (now stale) view
+    second_dense, second_keyword = dense.copy(), keyword.copy()
+    extend(store, second_dense, second_keyword, rng, 5, offset=1)
+
+    assert second_dense.index is not dense.index
+    assert second_keyword._postings is not keyword._postings
+    assert len(second_dense) == len(second_keyword) == 45
+    assert search_all(store, first_dense, first_keyword, queries, texts, monkeypatch) == first
+
+    # Chunks 40-49 belong to the first view only
+    for hits in second_dense.search(queries, k=45, fetch_k=45):
+        assert not {chunk_id for chunk_id, _ in hits} & set(range(40, 50))
@@ -0,0 +1,153 @@
+import pytest
+
+from ingestion.youtube import (
+    LocalTranscriptProvider,
+    TranscriptCache,
+    load_youtube_videos,
+    parse_video_id,
+    playlist_id,
+    resolve_video_ids,
+    segments_to_documents,
+)
+
+VIDEO_A = "dQw4w9WgXcQ"
+VIDEO_B = "9bZkp7q19f0"
+
+
+def segments(*texts, step=2.0):
+    return [{"text": t, "start": i * step, "duration": step} for i, t in enumerate(texts)]
+
+
+@pytest.fixture
+def provider():
+    return LocalTranscriptProvider(
+        {
+            VIDEO_A: {"en": segments("hello there", "general kenobi")},
+            VIDEO_B: {"de": segments("guten tag"), "fr": segments("bonjour")},
+        },
+        playlists={"PLdemo": [VIDEO_B, VIDEO_A]},
+    )
+
+
+def load(urls, provider, tmp_path, **kwargs):
+    cache = TranscriptCache(str(tmp_path / "transcripts"))
+    return load_youtube_videos(urls, provider=provider, cache=cache, rate=1000, **kwargs)
+
+
+# ==========================================================
+# Loader
+# ==========================================================
+
+def test_second_load_is_served_from_cache(provider, tmp_path):
+    urls = [VIDEO_A, f"https://youtu.be/{VIDEO_B}"]
+    first = load(urls, provider, tmp_path, languages=["en", "de"])
+    assert provider.calls == 2
+
+    second = load(urls, provider, tmp_path, languages=["en", "de"])
+    assert provider.calls == 2
+    assert [(d.page_content, d.metadata) for d in second] == [
+        (d.page_content, d.metadata) for d in first
+    ]
+
+
+def test_language_fallback(provider, tmp_path):
+    docs = load([VIDEO_B], provider, tmp_path, languages=["en", "fr", "de"])
+
+    assert [d.page_content for d in docs] == ["bonjour"]
+    assert docs[0].metadata["language"] == "fr"
+    assert (tmp_path / "transcripts" / f"{VIDEO_B}.fr.json").exists()
+
+    # Any requested language already on disk is a cache hit
+    docs = load([VIDEO_B], provider, tmp_path, languages=["de", "fr"])
+    assert docs[0].metadata["language"] == "fr"
+    assert provider.calls == 1
+
+
+def test_failed_videos_are_skipped_until_none_succeed(provider, tmp_path):
+    docs = load([VIDEO_A, "aaaaaaaaaaa"], provider, tmp_path, languages=["en"])
+    assert {d.metadata["video_id"] for d in docs} == {VIDEO_A}
+
+    with pytest.raises(ValueError):
+        load(["aaaaaaaaaaa"], provider, tmp_path, languages=["en"])
+
+
+def test_playlist_is_expanded_by_the_provider(provider, tmp_path):
+    docs = load(
+        ["https://www.youtube.com/playlist?list=PLdemo"], provider, tmp_path, languages=["en", "de"]
+    )
+    assert [d.metadata["video_id"] for d in docs] == [VIDEO_B, VIDEO_A]
+
+
+# ==========================================================
+# URL Handling
+# ==========================================================
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        VIDEO_A,
+        f"  {VIDEO_A}\n",
+        f"https://www.youtube.com/watch?v={VIDEO_A}",
+        f"https://m.youtube.com/watch?feature=share&v={VIDEO_A}",
+        f"https://www.youtube.com/watch?v={VIDEO_A}&list=PLdemo&index=2",
+        f"https://youtu.be/{VIDEO_A}",
+        f"https://youtu.be/{VIDEO_A}?t=42",
+        f"https://www.youtube.com/shorts/{VIDEO_A}",
+        f"https://www.youtube.com/embed/{VIDEO_A}",
+        f"https://www.youtube.com/live/{VIDEO_A}?si=abc",
+        f"https://www.youtube.com/v/{VIDEO_A}",
+    ],
+)
+def test_parse_video_id(url):
+    assert parse_video_id(url) == VIDEO_A
+
+
+@pytest.mark.parametrize(
+    "url",
+    ["", "not a video", "https://www.youtube.com/watch?v=short", "https://example.com/page"],
+)
+def test_parse_video_id_rejects_invalid(url):
+    with pytest.raises(ValueError):
+        parse_video_id(url)
+
+
+def test_playlist_id():
+    assert playlist_id("https://www.youtube.com/playlist?list=PLdemo") == "PLdemo"
+    assert playlist_id(f"https://www.youtube.com/watch?v={VIDEO_A}&list=PLdemo") == "PLdemo"
+    assert playlist_id(f"https://www.youtube.com/watch?v={VIDEO_A}") is None
+
+
+def test_watch_url_inside_a_playlist_loads_only_that_video(provider):
+    urls = [
+        f"https://www.youtube.com/watch?v={VIDEO_A}&list=PLdemo",
+        "https://www.youtube.com/playlist?list=PLdemo",
+    ]
+    assert resolve_video_ids(urls, provider) == [VIDEO_A, VIDEO_B]
+
+
+# ==========================================================
+# Segment-Aligned Documents
+# ==========================================================
+
+def test_grouped_segments_carry_their_time_span():
+    transcript = [
+        {"text": "aaaa", "start": 0.0, "duration": 1.5},
+        {"text": "bbbb", "start": 1.5, "duration": 2.0},
+        {"text": "\n", "start": 3.5, "duration": 0.5},  # blank, skipped
+        {"text": "cccc\ndd", "start": 4.0, "duration": 1.25},
+        {"text": "eeee", "start": 10.0, "duration": 0.333},
+    ]
+    docs = segments_to_documents(VIDEO_A, "en", transcript, max_chars=10)
+
+    assert [d.page_content for d in docs] == ["aaaa bbbb", "cccc dd", "eeee"]
+    assert [(d.metadata["start"], d.metadata["end"]) for d in docs] == [
+        (0.0, 3.5),
+        (4.0, 5.25),
+        (10.0, 10.33),
+    ]
+    assert docs[0].metadata["source"] == f"https://www.youtube.com/watch?v={VIDEO_A}"
+
+
+def test_long_segment_is_never_split():
+    docs = segments_to_documents(VIDEO_A, "en", segments("x" * 50, "y"), max_chars=10)
+    assert [d.page_content for d in docs] == ["x" * 50, "y"]
@@ -1,11 +1,20 @@
 # Logging configuration
 import logging
 
+_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
 def get_logger(name):
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+
+    # Streamlit re-executes the script on every interaction, so this is
+    # called repeatedly for the same name. Attach the handler only once.
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter(_FORMAT)
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+        logger.propagate = False
+
     return logger
@@ -0,0 +1,249 @@
+"""
+Lightweight tracing and metrics.
+
+- span(): times one pipeline stage and records it in the
+  process-wide metrics registry and in the active request trace.
+- start_trace(): collects the spans of a single request.
+- render_prometheus(): Prometheus text exposition of all metrics.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Latency buckets (seconds) shared by all stage histograms.
+# Covers sub-millisecond BM25 up to slow LLM calls / crawls.
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+# ==========================================================
+# Metrics Registry
+# ==========================================================
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms keyed by name + labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[_LabelKey, float] = {}
+        self._histograms: Dict[_LabelKey, List] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, object]) -> _LabelKey:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                # [per-bucket counts, sum, count]
+                hist = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+                self._histograms[key] = hist
+
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    hist[0][i] += 1
+                    break
+            hist[1] += value
+            hist[2] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Plain-dict view of all metrics (for the UI and load tests).
+        """
+        with self._lock:
+            counters = {
+                _format_series(name, labels): value
+                for (name, labels), value in self._counters.items()
+            }
+            histograms = {
+                _format_series(name, labels): {"sum": h[1], "count": h[2]}
+                for (name, labels), h in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h[0]), h[1], h[2]))
+                for key, h in self._histograms.items()
+            )
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{_format_series(name, labels)} {value:g}")
+
+        for (name, labels), (buckets, total, count) in histograms:
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, buckets):
+                cumulative += n
+                series = _format_series(
+                    f"{name}_bucket", labels + (("le", f"{bound:g}"),)
+                )
+                lines.append(f"{series} {cumulative}")
+
+            series = _format_series(f"{name}_bucket", labels + (("le", "+Inf"),))
+            lines.append(f"{series} {count}")
+            lines.append(f"{_format_series(name + '_sum', labels)} {total:.6f}")
+            lines.append(f"{_format_series(name + '_count', labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _format_series(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return name
+    body = ",".join(f'{k}="{v}"' for k, v in labels)
+    return f"{name}{{{body}}}"
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return _metrics
+
+
+def render_prometheus() -> str:
+    return _metrics.render_prometheus()
+
+
+# ==========================================================
+# Request Trace
+# ==========================================================
+
+class Trace:
+    """
+    Ordered list of spans recorded during one request.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict] = []
+
+    def add(
+        self,
+        record: Dict,
+        parent: Optional[str],
+        start: float,
+        elapsed: float,
+    ) -> None:
+        entry = dict(record)
+        entry["parent"] = parent
+        entry["start_ms"] = round((start - self._start) * 1000, 3)
+        entry["duration_ms"] = round(elapsed * 1000, 3)
+        with self._lock:
+            self.spans.append(entry)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "name": self.name,
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "spans": spans,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar(
+    "rag_current_trace", default=None
+)
+_current_span: ContextVar[Optional[str]] = ContextVar(
+    "rag_current_span", default=None
+)
+
+
+@contextmanager
+def start_trace(name: str):
+    """
+    Makes a fresh Trace the active one for the enclosed block.
+    """
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Times a stage. Yields a mutable dict so callers can attach
+    attributes (result counts, sizes) before the span closes.
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    token = _current_span.set(stage)
+
+    record = {"name": stage, **attrs}
+    start = time.perf_counter()
+
+    try:
+        yield record
+    except Exception:
+        record["error"] = True
+        _metrics.inc("rag_stage_errors_total", stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_span.reset(token)
+        _metrics.observe("rag_stage_seconds", elapsed, stage=stage)
+        if trace is not None:
+            trace.add(record, parent, start, elapsed)
+
+
+# ==========================================================
+# Domain Counters
+# ==========================================================
+
+def record_tokens(
+    model: str,
+    input_tokens: int = 0,
+    output_tokens: int = 0,
+) -> None:
+    if input_tokens:
+        _metrics.inc("rag_llm_tokens_total", input_tokens, model=model, kind="input")
+    if output_tokens:
+        _metrics.inc("rag_llm_tokens_total", output_tokens, model=model, kind="output")
+
+
+def record_embedding_input(model: str, texts: List[str]) -> None:
+    _metrics.inc("rag_embedded_texts_total", len(texts), model=model)
+    _metrics.inc("rag_embedded_chars_total", sum(len(t) for t in texts), model=model)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    _metrics.inc("rag_cache_requests_total", cache=cache, result="hit" if hit else "miss")